@@ -1,21 +1,16 @@
-from sense_hat import SenseHat
 from time import sleep
 import sys
 
-# Print default encoding and filesystem encoding for debugging purposes.
-# This helps in understanding how strings are handled in the environment.
-print(sys.getdefaultencoding())
-print(sys.getfilesystemencoding())
+# The Sense HAT object is created in main() so that importing this module has no side effects.
+sense = None
 
-# Create an instance of Sense HAT.
-# This object provides access to the Sense HAT's sensors and LED display.
-sense = SenseHat()
-# Clear the LED display, turning all pixels off.
-sense.clear()
-
-# Initialize a counter for the trial number.
-# This number will be incremented with each cycle of sensor readings.
-trial_number = 1
+def load_dependencies():
+    """
+    Imports the Sense HAT library needed by this mode.
+    The import is deferred so that the module can be loaded without the hardware bindings.
+    """
+    global SenseHat
+    from sense_hat import SenseHat
 
 def display_Barometric_pressure(trial):
     """
@@ -96,20 +91,45 @@ def display_magnetometer(trial):
     # Pause for 1 second before proceeding.
     sleep(1)
 
-# Main loop to continuously display sensor readings.
-# This loop runs indefinitely until the script is manually stopped (e.g., with Ctrl+C).
-while True:
-    # Call functions to display each sensor reading for the current trial.
-    display_Barometric_pressure(trial_number)
-    display_humidity(trial_number)
-    display_temperature(trial_number)
-    display_magnetometer(trial_number)
+def main(hat=None):
+    """
+    Continuously reads the sensors and displays each reading until the script is stopped.
+    :param hat: A SenseHat-like object to use instead of opening the hardware (e.g. one shared by the sampler).
+    """
+    global sense
+    load_dependencies()
+
+    # Print default encoding and filesystem encoding for debugging purposes.
+    # This helps in understanding how strings are handled in the environment.
+    print(sys.getdefaultencoding())
+    print(sys.getfilesystemencoding())
+
+    # Create an instance of Sense HAT.
+    # This object provides access to the Sense HAT's sensors and LED display.
+    # A shared Sense HAT can be passed in, so that several modes can use one sensor reader.
+    sense = hat if hat is not None else SenseHat()
+    # Clear the LED display, turning all pixels off.
+    sense.clear()
+
+    # Initialize a counter for the trial number.
+    # This number will be incremented with each cycle of sensor readings.
+    trial_number = 1
 
-    # Increment trial number for the next round of readings.
-    trial_number += 1
+    # Main loop to continuously display sensor readings.
+    # This loop runs indefinitely until the script is manually stopped (e.g., with Ctrl+C).
+    while True:
+        # Call functions to display each sensor reading for the current trial.
+        display_Barometric_pressure(trial_number)
+        display_humidity(trial_number)
+        display_temperature(trial_number)
+        display_magnetometer(trial_number)
 
-    # Wait for 5 seconds before the next set of readings.
-    # This pause controls the frequency of sensor data updates.
-    sleep(5) 
+        # Increment trial number for the next round of readings.
+        trial_number += 1
 
+        # Wait for 5 seconds before the next set of readings.
+        # This pause controls the frequency of sensor data updates.
+        sleep(5)
 
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
+import os
+import sys
 import time
 import json
-import paho.mqtt.client as mqtt # Use your own Alias
-from sense_hat import SenseHat
+import threading
+
+# Make the sensehat_iot package in the project root importable when this script is run directly.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
 # --- MQTT Settings ---
 # The IP address of the MQTT broker.
@@ -16,10 +22,82 @@ MQTT_TOPIC_PRESSURE = "home/sensors/pressure"
 MQTT_TOPIC_TEMPERATURE = "home/sensors/temperature"
 MQTT_TOPIC_MAGNETOMETER = "home/sensors/magnetometer"
 MQTT_TOPIC_HUMIDITY = "home/sensors/humidity"
+# Topic on which the effective sampling rate of each sensor is published.
+MQTT_TOPIC_SAMPLE_RATE = "home/sensors/sample_rate"
+# Topic on which batches of readings are published when batching is enabled.
+MQTT_TOPIC_BATCH = "home/sensors/batch"
+
+# --- Sampling Settings ---
+# With adaptive sampling, each sensor is read faster while its value is changing and
+# progressively slower while it is steady, between the floor and ceiling rates.
+# Without it, every sensor is read once per second.
+ADAPTIVE_SAMPLING = False
+# Lowest and highest sampling rates (readings per second) used by adaptive sampling.
+MIN_SAMPLE_RATE = 0.1
+MAX_SAMPLE_RATE = 5.0
+# Rate of change (units per second) and spread (standard deviation of the last few readings)
+# above which a sensor counts as changing.
+CHANGE_THRESHOLDS = {
+    "temperature": (0.05, 0.1),  # degree celsius
+    "humidity": (0.2, 0.5),      # %
+    "pressure": (0.05, 0.1),     # hPa
+    "magnetometer": (2.0, 5.0),  # degrees
+}
+# Seconds between two publications of the effective sampling rates.
+SAMPLE_RATE_INTERVAL = 60
+
+# --- Batching Settings ---
+# Number of sampling rounds collected into one compressed message on MQTT_TOPIC_BATCH
+# (see sensehat_iot/batchcodec.py). Batches keep two decimal places of every reading.
+# 1 publishes every reading on its own topic as soon as it is taken.
+BATCH_SIZE = 1
+# Compression of the batches: "zlib", "zstd" (needs the zstandard package) or "none".
+BATCH_CODEC = "zlib"
 
-# Create an MQTT client instance.
-# protocol=mqtt.MQTTv5 specifies the MQTT protocol version to use.
-client = mqtt.Client(protocol=mqtt.MQTTv5)
+# --- Delivery Settings ---
+# QoS level used for each topic.
+# 0 = "at most once", 1 = "at least once", 2 = "exactly once".
+MQTT_TOPIC_QOS = {
+    MQTT_TOPIC_PRESSURE: 1,
+    MQTT_TOPIC_TEMPERATURE: 1,
+    MQTT_TOPIC_MAGNETOMETER: 1,
+    MQTT_TOPIC_HUMIDITY: 1,
+    MQTT_TOPIC_BATCH: 1,
+}
+# Maximum number of messages that may be waiting for the broker's acknowledgement.
+# When the window is full, publishing blocks until a slot is freed (backpressure).
+MAX_INFLIGHT_MESSAGES = 20
+# Seconds to wait for a free in-flight slot before the sample is dropped.
+INFLIGHT_WAIT_TIMEOUT = 5
+# Number of times a rejected publish call is retried before the sample is dropped.
+PUBLISH_RETRIES = 3
+# Seconds to wait between publish retries.
+PUBLISH_RETRY_DELAY = 0.5
+# Seconds after which an unacknowledged QoS 0 message is counted as dropped.
+# QoS 1/2 messages are kept by paho and re-sent after a reconnect, so they never expire.
+QOS0_ACK_TIMEOUT = 30
+# Upper bounds (in milliseconds) of the publish-to-PUBACK latency histogram buckets.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Number of iterations between delivery statistics printouts.
+STATS_INTERVAL = 10
+
+# The MQTT client, Sense HAT and delivery tracker objects are created in main() so that
+# importing this module has no side effects, and settings changed after import apply.
+client = None
+sense = None
+tracker = None
+
+def load_dependencies():
+    """
+    Imports the MQTT, Sense HAT and scheduler modules needed by this mode.
+    The imports are deferred so that the module can be loaded without them.
+    """
+    global mqtt, SenseHat, AdaptiveScheduler, clock, batchcodec
+    import paho.mqtt.client as mqtt # Use your own Alias
+    from sense_hat import SenseHat
+    from sensehat_iot.adaptive import AdaptiveScheduler
+    from sensehat_iot import clock
+    from sensehat_iot import batchcodec
 
 def on_connect(client, userdata, flags, rc, properties=None):
     """
@@ -36,11 +114,135 @@ def on_connect(client, userdata, flags, rc, properties=None):
     else:
         print(f"Failed to connect, return code {rc}\n")
 
-# Initialize Sense HAT.
-# This object provides access to the Sense HAT's sensors and LED display.
-sense = SenseHat()
-# Clear the LED display, turning all pixels off.
-sense.clear()
+# --- Delivery Accounting ---
+class DeliveryTracker:
+    """
+    Tracks every message handed to paho until the broker acknowledges it.
+    A bounded semaphore limits the number of in-flight messages, and the
+    acknowledgements feed the delivered/dropped/retried counters and a
+    publish-to-PUBACK latency histogram of the QoS 1/2 messages.
+    """
+
+    def __init__(self, window):
+        """
+        :param window: Maximum number of unacknowledged messages.
+        """
+        self.slots = threading.BoundedSemaphore(window)
+        self.lock = threading.Lock()
+        self.pending = {}      # mid -> (topic, qos, publish time)
+        self.early_acks = {}   # mid -> ack time, for acks that arrive before publish() returns
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0, "retried": 0}
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def publish(self, client, topic, payload, qos):
+        """
+        Publishes a payload once an in-flight slot is free, retrying rejected publish calls.
+        :param client: The connected MQTT client.
+        :param topic: The MQTT topic to publish to.
+        :param payload: The message payload.
+        :param qos: The QoS level for this message.
+        :return: True if the message was accepted by paho, False if it was dropped.
+        """
+        # Block while the in-flight window is full; give up after the timeout.
+        if not self.slots.acquire(timeout=INFLIGHT_WAIT_TIMEOUT):
+            with self.lock:
+                self.counters["dropped"] += 1
+            return False
+
+        for attempt in range(PUBLISH_RETRIES + 1):
+            if attempt:
+                with self.lock:
+                    self.counters["retried"] += 1
+                time.sleep(PUBLISH_RETRY_DELAY)
+
+            start = time.monotonic()
+            # Our lock must not be held here: paho calls on_publish while holding its own
+            # message lock, so holding both in opposite order could deadlock.
+            info = client.publish(topic, payload, qos=qos, retain=False)
+            # For QoS 1/2, MQTT_ERR_NO_CONN means paho queued the message for the next connection.
+            if info.rc == mqtt.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN):
+                with self.lock:
+                    self.counters["published"] += 1
+                    ack_time = self.early_acks.pop(info.mid, None)
+                    if ack_time is None:
+                        self.pending[info.mid] = (topic, qos, start)
+                        return True
+                    self._record_delivery(ack_time - start, qos)
+                self.slots.release()
+                return True
+
+        with self.lock:
+            self.counters["dropped"] += 1
+        self.slots.release()
+        return False
+
+    def on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        """
+        Callback function executed when a message has been sent (QoS 0) or acknowledged (QoS 1/2).
+        :param client: The client instance for this callback.
+        :param userdata: The private user data.
+        :param mid: The message ID returned by client.publish().
+        :param reason_code: The MQTTv5 reason code (callback API version 2 only).
+        :param properties: MQTTv5 properties.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.pending.pop(mid, None)
+            if entry is None:
+                # publish() has not returned yet; it will complete the delivery itself.
+                self.early_acks[mid] = now
+                return
+            if reason_code is not None and getattr(reason_code, "is_failure", False):
+                self.counters["dropped"] += 1
+            else:
+                self._record_delivery(now - entry[2], entry[1])
+        self.slots.release()
+
+    def expire(self):
+        """
+        Counts QoS 0 messages that were never sent (e.g. lost on a disconnect) as dropped
+        and frees their in-flight slots.
+        """
+        deadline = time.monotonic() - QOS0_ACK_TIMEOUT
+        with self.lock:
+            expired = [mid for mid, (_, qos, start) in self.pending.items() if qos == 0 and start < deadline]
+            for mid in expired:
+                del self.pending[mid]
+                self.counters["dropped"] += 1
+        for _ in expired:
+            self.slots.release()
+
+    def _record_delivery(self, latency, qos):
+        """
+        Adds one delivered message to the counters, and to the latency histogram if it was acknowledged.
+        A QoS 0 message has no PUBACK; its callback only means it was written to the socket.
+        Must be called with the lock held.
+        :param latency: Seconds between the publish call and the callback.
+        :param qos: The QoS level of the message.
+        """
+        self.counters["delivered"] += 1
+        if qos == 0:
+            return
+        latency_ms = latency * 1000
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.histogram[index] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def report(self):
+        """
+        Prints the delivery counters and the latency histogram to the console.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histogram = list(self.histogram)
+            in_flight = len(self.pending)
+        print(f"Delivery: published={counters['published']} delivered={counters['delivered']} "
+              f"dropped={counters['dropped']} retried={counters['retried']} in-flight={in_flight}")
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        print("PUBACK latency: " + ", ".join(f"{label}: {count}" for label, count in zip(labels, histogram)))
 
 # --- Sensor Data Retrieval Functions ---
 def get_barometric_pressure():
@@ -84,82 +286,168 @@ def get_humidity():
     humidity = round(humidity, 2)
     return humidity
 
+def create_scheduler():
+    """
+    Creates the scheduler that decides when each sensor is read.
+    :return: An AdaptiveScheduler reading every sensor once per second, or adaptively if ADAPTIVE_SAMPLING is set.
+    """
+    if ADAPTIVE_SAMPLING:
+        scheduler = AdaptiveScheduler(MIN_SAMPLE_RATE, MAX_SAMPLE_RATE)
+    else:
+        scheduler = AdaptiveScheduler(1.0, 1.0)
+    scheduler.add_metric("temperature", get_temperature, *CHANGE_THRESHOLDS["temperature"])
+    scheduler.add_metric("humidity", get_humidity, *CHANGE_THRESHOLDS["humidity"])
+    scheduler.add_metric("pressure", get_barometric_pressure, *CHANGE_THRESHOLDS["pressure"])
+    scheduler.add_metric("magnetometer", get_compass, *CHANGE_THRESHOLDS["magnetometer"], circular=True)
+    return scheduler
+
+def publish_batch(batch):
+    """
+    Publishes the collected readings as one compressed message on MQTT_TOPIC_BATCH.
+    :param batch: A list of (nanoseconds, metric, value) tuples.
+    """
+    payload = batchcodec.encode_batch(batch, BATCH_CODEC)
+    qos = MQTT_TOPIC_QOS[MQTT_TOPIC_BATCH]
+    if tracker.publish(client, MQTT_TOPIC_BATCH, payload, qos):
+        print(f"Published batch of {len(batch)} readings to {MQTT_TOPIC_BATCH}: {len(payload)} bytes (QoS: {qos}, Retain: False)")
+    else:
+        print(f"Dropped batch of {len(batch)} readings for {MQTT_TOPIC_BATCH} (QoS: {qos})")
+
 # --- Main Program Execution ---
-try:
-    # Assign the on_connect callback function.
-    client.on_connect = on_connect
-    # Connect to the MQTT broker.
-    # The last argument (60) is the keepalive interval in seconds.
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    # Start a new thread to process network traffic (send/receive messages).
-    # This allows the main thread to continue with sensor reading and publishing.
-    client.loop_start()
-
-    iteration = 0 # Initialize iteration counter for console output.
-
-    # Infinite loop to continuously read sensors and publish data.
-    while True:
-        try:
-            # Read data from all Sense HAT sensors.
-            temperature = get_temperature()
-            humidity = get_humidity()
-            pressure = get_barometric_pressure()
-            magnetometer = get_compass()
-
-            # Increment and print the current iteration number.
-            iteration += 1
-            print(f"Iteration {iteration}")
-            # Print all sensor data to the console for real-time monitoring.
-            print(f"Temperature: {temperature:.2f} degree celsius")
-            print(f"Humidity: {humidity:.2f} %")
-            print(f"Pressure: {pressure:.2f} hPa")
-            print(f"Magnetometer: {magnetometer:.2f} degrees")
-            print("-" * 72)
-
-            # Get current timestamp for data logging.
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            print(f"Current date & time {timestamp}")
-
-            # Create a JSON object containing all sensor data and timestamp.
-            # This is useful for publishing a single, comprehensive message.
-            sensor_data = {
-                "timestamp": timestamp,
-                "temperature": temperature,
-                "humidity": humidity,
-                "pressure": pressure,
-                "magnetometer": magnetometer
-            }
-
-            print("-" * 72)
-
-            # Publish each sensor data point to its respective MQTT topic.
-            # json.dumps() converts the Python dictionary to a JSON string.
-            # qos=0 means "at most once" delivery (no guarantee of delivery).
-            # retain=False means the broker will not store the last message.
-            client.publish(MQTT_TOPIC_PRESSURE, json.dumps({"pressure": pressure}), qos=0, retain=False)
-            print(f"Published to {MQTT_TOPIC_PRESSURE}: {pressure:.2f} (QoS: 0, Retain: False)")
-
-            client.publish(MQTT_TOPIC_TEMPERATURE, json.dumps({"temperature": temperature}), qos=0, retain=False)
-            print(f"Published to {MQTT_TOPIC_TEMPERATURE}: {temperature:.2f} degree celsius (QoS: 0, Retain: False)")
-
-            client.publish(MQTT_TOPIC_MAGNETOMETER, json.dumps({"magnetometer": magnetometer}), qos=0, retain=False)
-            print(f"Published to {MQTT_TOPIC_MAGNETOMETER}: {magnetometer:.2f} degrees (QoS: 0, Retain: False)")
-
-            client.publish(MQTT_TOPIC_HUMIDITY, json.dumps({"humidity": humidity}), qos=0, retain=False)
-            print(f"Published to {MQTT_TOPIC_HUMIDITY}: {humidity:.2f} (QoS: 0, Retain: False)")
-
-            # Wait for 1 second before the next sensor reading and publishing cycle.
-            time.sleep(1)
-
-        except Exception as e:
-            # Catch any exceptions during sensor reading or data publishing.
-            print(f"Error reading sensors or publishing data: {e}")
-
-except KeyboardInterrupt:
-    # Handle KeyboardInterrupt (Ctrl+C) to gracefully exit the program.
-    print("Exiting program.")
-finally:
-    # Stop the MQTT network loop and disconnect from the broker.
-    client.loop_stop()
-    client.disconnect()
+def main(hat=None):
+    """
+    Connects to the MQTT broker and publishes the sensor readings every second until interrupted.
+    :param hat: A SenseHat-like object to use instead of opening the hardware (e.g. one shared by the sampler).
+    """
+    global client, sense, tracker, BATCH_CODEC
+    load_dependencies()
+
+    if BATCH_SIZE > 1 and BATCH_CODEC not in batchcodec.available_codecs():
+        print(f"Batch codec {BATCH_CODEC!r} is not available (pip3 install zstandard for zstd); using zlib")
+        BATCH_CODEC = "zlib"
+
+    # Create an MQTT client instance.
+    # protocol=mqtt.MQTTv5 specifies the MQTT protocol version to use.
+    client = mqtt.Client(protocol=mqtt.MQTTv5)
+    # Track the messages in flight, with the same window as paho (set below).
+    tracker = DeliveryTracker(MAX_INFLIGHT_MESSAGES)
+
+    # Initialize Sense HAT.
+    # This object provides access to the Sense HAT's sensors and LED display.
+    # A shared Sense HAT can be passed in, so that several modes can use one sensor reader.
+    sense = hat if hat is not None else SenseHat()
+    # Clear the LED display, turning all pixels off.
+    sense.clear()
+
+    # Readings waiting to be published as one batch, and the number of sampling rounds they cover.
+    batch = []
+    batch_rounds = 0
+
+    try:
+        # Assign the on_connect callback function.
+        client.on_connect = on_connect
+        # Assign the on_publish callback so every acknowledgement reaches the delivery tracker.
+        client.on_publish = tracker.on_publish
+        # Let paho hold at most as many in-flight messages as the tracker allows.
+        client.max_inflight_messages_set(MAX_INFLIGHT_MESSAGES)
+        # Connect to the MQTT broker.
+        # The last argument (60) is the keepalive interval in seconds.
+        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        # Start a new thread to process network traffic (send/receive messages).
+        # This allows the main thread to continue with sensor reading and publishing.
+        client.loop_start()
+
+        iteration = 0 # Initialize iteration counter for console output.
+        scheduler = create_scheduler()
+        next_rate_report = time.monotonic() + SAMPLE_RATE_INTERVAL
+
+        # MQTT topic, console label and unit of each sensor reading.
+        outputs = {
+            "temperature": (MQTT_TOPIC_TEMPERATURE, "Temperature", " degree celsius"),
+            "humidity": (MQTT_TOPIC_HUMIDITY, "Humidity", " %"),
+            "pressure": (MQTT_TOPIC_PRESSURE, "Pressure", " hPa"),
+            "magnetometer": (MQTT_TOPIC_MAGNETOMETER, "Magnetometer", " degrees"),
+        }
+
+        # Infinite loop to continuously read sensors and publish data.
+        while True:
+            try:
+                # Read the sensors that are due according to the scheduler.
+                # The readings are stamped with the time they were taken, in nanoseconds since the epoch
+                # (the time of the sampler's snapshot when the Sense HAT is shared).
+                read_ns = clock.read_ns(sense)
+                readings = scheduler.poll(time.monotonic())
+
+                if readings:
+                    # Increment and print the current iteration number.
+                    iteration += 1
+                    print(f"Iteration {iteration}")
+                    # Print the sensor data to the console for real-time monitoring.
+                    for key, value in readings.items():
+                        _, label, unit = outputs[key]
+                        print(f"{label}: {value:.2f}{unit}")
+                    print("-" * 72)
+
+                    # Format the read time for the console; the payloads carry it as an integer.
+                    print(f"Current date & time {clock.format_ns(read_ns, 3)}")
+                    print("-" * 72)
+
+                    # Publish each sensor data point to its respective MQTT topic.
+                    # The payload is a JSON object with the reading and its read time, e.g.
+                    # {"temperature": 21.5, "ts": 1714557600123456789}.
+                    # The QoS level comes from MQTT_TOPIC_QOS; publishing blocks while the in-flight window is full.
+                    # retain=False means the broker will not store the last message.
+                    # With batching, the readings are collected and published every BATCH_SIZE rounds instead.
+                    if BATCH_SIZE > 1:
+                        batch.extend((read_ns, key, value) for key, value in readings.items())
+                        batch_rounds += 1
+                        if batch_rounds >= BATCH_SIZE:
+                            publish_batch(batch)
+                            batch = []
+                            batch_rounds = 0
+                    else:
+                        for key, value in readings.items():
+                            topic, _, unit = outputs[key]
+                            qos = MQTT_TOPIC_QOS[topic]
+                            if tracker.publish(client, topic, clock.encode_reading(key, value, read_ns), qos):
+                                print(f"Published to {topic}: {value:.2f}{unit} (QoS: {qos}, Retain: False)")
+                            else:
+                                print(f"Dropped {key} sample for {topic} (QoS: {qos})")
+
+                    # Release slots held by QoS 0 messages that were lost, and report delivery statistics.
+                    tracker.expire()
+                    if iteration % STATS_INTERVAL == 0:
+                        tracker.report()
+
+                # Publish how many readings per second each sensor actually got.
+                if time.monotonic() >= next_rate_report:
+                    rates = scheduler.effective_rates(time.monotonic())
+                    tracker.publish(client, MQTT_TOPIC_SAMPLE_RATE,
+                                    json.dumps({**rates, clock.TIMESTAMP_KEY: clock.now_ns()}), 0)
+                    print(f"Effective sample rates (readings/s): {rates}")
+                    next_rate_report += SAMPLE_RATE_INTERVAL
+
+                # Wait until the next sensor is due.
+                time.sleep(max(0.0, min(scheduler.next_due(), next_rate_report) - time.monotonic()))
+
+            except Exception as e:
+                # Catch any exceptions during sensor reading or data publishing.
+                print(f"Error reading sensors or publishing data: {e}")
+                # Wait before retrying so a failing sensor does not keep the loop busy.
+                time.sleep(1)
+
+    except KeyboardInterrupt:
+        # Handle KeyboardInterrupt (Ctrl+C) to gracefully exit the program.
+        print("Exiting program.")
+    finally:
+        # Publish the readings of an unfinished batch so they are not lost.
+        if BATCH_SIZE > 1 and batch:
+            publish_batch(batch)
+        # Print the final delivery statistics.
+        tracker.report()
+        # Stop the MQTT network loop and disconnect from the broker.
+        client.loop_stop()
+        client.disconnect()
 
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,5 @@
 import time
-import paho.mqtt.client as mqtt
-from sense_hat import SenseHat
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from collections import deque
 
 # --- MQTT Settings ---
 # The MQTT broker address and topics for different sensor data are defined.
@@ -14,8 +11,23 @@ MQTT_TOPIC_TEMPERATURE = "home/sensors/temperature"
 MQTT_TOPIC_MAGNETOMETER = "home/sensors/magnetometer"
 MQTT_TOPIC_HUMIDITY = "home/sensors/humidity"
 
-# Create an MQTT client instance using the latest API version (MQTTv5).
-client = mqtt.Client(protocol=mqtt.MQTTv5)
+# The MQTT client, Sense HAT and figure objects are created in main() so that
+# importing this module has no side effects.
+client = None
+sense = None
+fig = None
+axs = None
+
+def load_dependencies():
+    """
+    Imports the MQTT, Sense HAT and matplotlib libraries needed by this mode.
+    The imports are deferred so that the module can be loaded without them.
+    """
+    global mqtt, SenseHat, plt, FuncAnimation
+    import paho.mqtt.client as mqtt
+    from sense_hat import SenseHat
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
 
 def on_connect(client, userdata, flags, rc, properties=None):
     """
@@ -27,15 +39,6 @@ def on_connect(client, userdata, flags, rc, properties=None):
     else:
         print(f"Failed to connect, return code {rc}\n")
 
-# Assign the connection callback function to the client.
-client.on_connect = on_connect
-
-# Initialize Sense HAT.
-# This object provides access to the Sense HAT's sensors and LED display.
-sense = SenseHat()
-# Clear the LED display, turning all pixels off.
-sense.clear()
-
 # --- Sensor Data Retrieval Functions ---
 def get_pressure():
     """
@@ -79,18 +82,17 @@ def get_humidity():
     return humidity
 
 # --- Data Storage for Plotting ---
-# Initialize lists to store sensor data over time for plotting.
-temperatures = []
-humidities = []
-pressures = []
-magnetometer_data = []
-times = [] # Stores Unix timestamps
-
-# --- Matplotlib Plot Initialization ---
-# Create a figure and a set of subplots (4 rows, 1 column) for each sensor.
-fig, axs = plt.subplots(4, 1, figsize=(8, 6))
-# Set the main title for the entire figure.
-fig.suptitle('Real-time Sensor Data', fontsize=14)
+# Number of most recent data points kept and plotted.
+MAX_POINTS = 100
+# Initialize bounded queues to store sensor data over time for plotting.
+# Once MAX_POINTS entries are stored, appending a new one drops the oldest, so memory stays constant.
+temperatures = deque(maxlen=MAX_POINTS)
+humidities = deque(maxlen=MAX_POINTS)
+pressures = deque(maxlen=MAX_POINTS)
+magnetometer_data = deque(maxlen=MAX_POINTS)
+times = deque(maxlen=MAX_POINTS) # Stores monotonic clock readings in nanoseconds
+# Monotonic clock reading of the first data point, used as the origin of the x-axis.
+start_time = None
 
 def update_plot(i):
     """
@@ -98,40 +100,37 @@ def update_plot(i):
     It reads current sensor data, appends it to lists, and redraws the plots.
     :param i: The frame number (unused in this specific implementation but required by FuncAnimation).
     """
+    global start_time
     # Read current values from the Sense HAT sensors.
     temperature = get_temperature()
     humidity = get_humidity()
     pressure = get_pressure()
     magnetometer = get_compass()
 
-    # Append the newly read data to their respective lists.
+    # Append the newly read data to their respective queues.
     temperatures.append(temperature)
     humidities.append(humidity)
     pressures.append(pressure)
     magnetometer_data.append(magnetometer)
 
-    # Get the current Unix timestamp (seconds since epoch).
-    current_time = int(time.time())
+    # Get the current monotonic clock reading as an integer number of nanoseconds.
+    # Unlike the wall clock, it never jumps, so the x-axis stays evenly spaced.
+    current_time = time.monotonic_ns()
     times.append(current_time)
+    if start_time is None:
+        start_time = current_time
 
     # Wait for 1 second before collecting the next timestamp.
     # This sleep also controls the update rate of the plot.
     time.sleep(1)
 
-    # Print the collected timestamps for debugging/monitoring.
-    print("Collected timestamps:", times)    
-
-    # Convert absolute Unix timestamps to relative time in seconds
-    # from the start of data collection. This makes the x-axis more readable.
-    times_in_seconds = [(t - times[0]) for t in times]  
+    # Print the wall clock time of the latest point for debugging/monitoring.
+    print("Collected timestamp:", time.strftime("%Y-%m-%d %H:%M:%S"))
 
-    # Limit the data to the last 100 entries to keep the plots manageable and real-time.
-    if len(times_in_seconds) > 100:
-        temperatures.pop(0) # Remove the oldest data point
-        humidities.pop(0)
-        pressures.pop(0)
-        magnetometer_data.pop(0)
-        times_in_seconds.pop(0)
+    # Convert the timestamps to seconds from the start of data collection, only for display.
+    # This makes the x-axis more readable.
+    # Only the last MAX_POINTS entries are kept, so the plots stay manageable and real-time.
+    times_in_seconds = [(t - start_time) / 1e9 for t in times]
 
     # --- Update each subplot ---
     # Clear the previous plot content.
@@ -167,30 +166,53 @@ def update_plot(i):
     plt.tight_layout()
 
 # --- Main Program Execution ---
-try:
-    # Connect to the MQTT broker.
-    # Although connected, this script does not actively publish or subscribe data in the main loop.
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    # Start the MQTT network loop in a separate thread.
-    client.loop_start()    
-      
-       
-    # Create the animation.
-    # FuncAnimation calls update_plot every 'interval' milliseconds (1000ms = 1 second).
-    ani = FuncAnimation(fig, update_plot, interval=1000)
-
-    # Display the Matplotlib plot. This call blocks until the plot window is closed.
-    plt.show()
-
-except KeyboardInterrupt:
-    # Handle KeyboardInterrupt (Ctrl+C) to gracefully exit the program.
-    print("Exiting program.")
-finally:
-    # Stop the MQTT network loop and disconnect from the broker.
-    client.loop_stop()
-    client.disconnect()
-
-
-
-
-
+def main(hat=None):
+    """
+    Connects to the MQTT broker and shows a live plot of the sensor readings until the window is closed.
+    :param hat: A SenseHat-like object to use instead of opening the hardware (e.g. one shared by the sampler).
+    """
+    global client, sense, fig, axs
+    load_dependencies()
+
+    # Create an MQTT client instance using the latest API version (MQTTv5).
+    client = mqtt.Client(protocol=mqtt.MQTTv5)
+    # Assign the connection callback function to the client.
+    client.on_connect = on_connect
+
+    # Initialize Sense HAT.
+    # This object provides access to the Sense HAT's sensors and LED display.
+    # A shared Sense HAT can be passed in, so that several modes can use one sensor reader.
+    sense = hat if hat is not None else SenseHat()
+    # Clear the LED display, turning all pixels off.
+    sense.clear()
+
+    # --- Matplotlib Plot Initialization ---
+    # Create a figure and a set of subplots (4 rows, 1 column) for each sensor.
+    fig, axs = plt.subplots(4, 1, figsize=(8, 6))
+    # Set the main title for the entire figure.
+    fig.suptitle('Real-time Sensor Data', fontsize=14)
+
+    try:
+        # Connect to the MQTT broker.
+        # Although connected, this script does not actively publish or subscribe data in the main loop.
+        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        # Start the MQTT network loop in a separate thread.
+        client.loop_start()
+
+        # Create the animation.
+        # FuncAnimation calls update_plot every 'interval' milliseconds (1000ms = 1 second).
+        ani = FuncAnimation(fig, update_plot, interval=1000)
+
+        # Display the Matplotlib plot. This call blocks until the plot window is closed.
+        plt.show()
+
+    except KeyboardInterrupt:
+        # Handle KeyboardInterrupt (Ctrl+C) to gracefully exit the program.
+        print("Exiting program.")
+    finally:
+        # Stop the MQTT network loop and disconnect from the broker.
+        client.loop_stop()
+        client.disconnect()
+
+if __name__ == "__main__":
+    main()
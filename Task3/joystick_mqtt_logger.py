@@ -1,15 +1,35 @@
-from sense_hat import SenseHat
-import paho.mqtt.client as paho
 import csv
 import os
+import sys
 import time
-from datetime import datetime  # Importing datetime module for timestamps
 
-# --- Sense HAT Initialization ---
-# Create an instance of Sense HAT.
-sense = SenseHat()
-# Clear the LED display, turning all pixels off.
-sense.clear()
+# Make the sensehat_iot package in the project root importable when this script is run directly.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# The Sense HAT, MQTT client and CSV writer objects are created in main() so that
+# importing this module has no side effects.
+sense = None
+client = None
+writer = None
+
+def load_dependencies():
+    """
+    Imports the Sense HAT, MQTT and CSV writer modules needed by this mode.
+    The imports are deferred so that the module can be loaded without them.
+    """
+    global SenseHat, paho, ShardedWriter, clock, batchcodec
+    from sense_hat import SenseHat
+    import paho.mqtt.client as paho
+    from sensehat_iot.shardwriter import ShardedWriter
+    from sensehat_iot import clock
+    from sensehat_iot import batchcodec
+
+# --- MQTT Settings ---
+# The address and port of the MQTT broker the readings are received from (and published to).
+MQTT_BROKER = "127.0.0.1"
+MQTT_PORT = 1883
 
 # --- Color Definitions for LED Display ---
 # These RGB tuples are used to display letters on the Sense HAT LED matrix
@@ -25,12 +45,36 @@ green = (0, 255, 0)
 # This path is specific to the user's desktop environment.
 csv_directory = "/home/takashi/Desktop/DANCT702_A2/DANCT702_A2_CSV_files"
 
-# Ensure the CSV directory exists. If not, create it.
-if not os.path.exists(csv_directory):
-    os.makedirs(csv_directory)
-    print(f"Directory created: {csv_directory}")
-else:
-    print(f"Directory already exists: {csv_directory}")
+# Map each MQTT topic to the CSV file its data is logged to.
+csv_files = {
+    "TempeTopic": "Temperature.csv",
+    "PressureTopic": "Barometric pressure.csv",
+    "HumidityTopic": "Humidity.csv",
+    "MagnetometerTopic": "Magnetometer.csv",
+}
+# Number of writer processes. The topics are assigned to them in turn, and each
+# process owns the files of its topics. Only one topic is subscribed at a time,
+# so one process is enough; more only help when several topics are logged at once.
+writer_processes = 1
+# Print every logged row. The rows are printed by the writer processes, so the
+# MQTT network thread only decodes and enqueues.
+print_rows = True
+
+# --- Batched Data ---
+# Topic of the compressed batches sent by the Task2 publisher when batching is enabled.
+batch_topic = "home/sensors/batch"
+# Map each metric in a batch to the CSV file it is logged to. Batches arrive up to a
+# batch period after their readings were taken, so they are kept apart from the files
+# of this script's own readings, which must stay in time order for replay and query.
+batch_csv_files = {
+    "temperature": "Batch temperature.csv",
+    "pressure": "Batch barometric pressure.csv",
+    "humidity": "Batch humidity.csv",
+    "magnetometer": "Batch magnetometer.csv",
+}
+# The newest read time logged to each batch file. Readings that are not newer, e.g. from
+# a batch redelivered by the broker, are skipped so that each file stays in time order.
+batch_last_ns = {}
 
 # --- MQTT Callbacks ---
 def on_subscribe(client, userdata, mid, granted_qos):
@@ -47,169 +91,197 @@ def on_subscribe(client, userdata, mid, granted_qos):
 def on_message(client, userdata, msg):
     """
     Callback function executed when a message is received on a subscribed topic.
-    It decodes the message payload and writes it to a corresponding CSV file.
+    It decodes the reading and its timestamp and hands them to the writer process that owns the topic's CSV file.
+    Nothing is written to disk or the console here, so a slow write cannot delay the receipt of other messages.
     :param client: The client instance for this callback.
     :param userdata: The private user data.
     :param msg: An MQTTMessage object containing topic, payload, qos, retain, etc.
     """
-    print(f"Received message on topic {msg.topic}: {msg.payload.decode()}")
+    # Batches are binary; log every reading to its metric's batch file with the time it was read.
+    if msg.topic == batch_topic:
+        try:
+            readings = batchcodec.decode_batch(msg.payload)
+        except ValueError as e:
+            print(f"Skipping invalid batch on {msg.topic}: {e}")
+            return
+        print(f"Received batch of {len(readings)} readings on topic {msg.topic}")
+        for ns, metric, value in readings:
+            if metric in batch_csv_files and ns > batch_last_ns.get(metric, 0):
+                batch_last_ns[metric] = ns
+                writer.submit(f"{batch_topic}/{metric}", batch_csv_files[metric], ns, value)
+        return
+    # If the payload is empty, default to "0".
+    payload = msg.payload.decode() or "0"
     # Determine which CSV file to write to based on the message topic.
-    if msg.topic == "TempeTopic":
-        write("Temperature.csv", msg.payload)
-    elif msg.topic == "PressureTopic":
-        write("Barometric pressure.csv", msg.payload)
-    elif msg.topic == "HumidityTopic":
-        write("Humidity.csv", msg.payload)
-    elif msg.topic == "MagnetometerTopic":
-        write("Magnetometer.csv", msg.payload)
-
-# --- Data Logging Function ---
-def write(title, data):
+    if msg.topic in csv_files:
+        try:
+            value, ns = clock.decode_reading(payload)
+        except ValueError as e:
+            print(f"Skipping invalid data for {msg.topic}: {e}")
+            return
+        # Keep the time the sensor was read; payloads without one are stamped on receipt.
+        writer.submit(msg.topic, csv_files[msg.topic], ns if ns is not None else clock.now_ns(), value)
+
+# --- Main Program Execution ---
+def main(hat=None):
     """
-    Writes sensor data along with a timestamp to a specified CSV file.
-    :param title: The filename of the CSV file (e.g., "Temperature.csv").
-    :param data: The sensor data payload received from MQTT.
+    Subscribes to the topic selected with the joystick and logs the received data until interrupted.
+    :param hat: A SenseHat-like object to use instead of opening the hardware (e.g. one shared by the sampler).
     """
-    file_path = os.path.join(csv_directory, title)
-    print(f"Writing data to {file_path}")
-
-    # Get the current timestamp in "YYYY-MM-DD HH:MM:SS" format.
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Decode the data payload. If data is empty or None, default to "0".
-    decoded_data = data.decode() if data else "0"
-    
-    # Format the decoded data to two decimal places as a float.
-    formatted_data = f"{float(decoded_data):.2f}"
-
-    # Append the timestamp and formatted data to the CSV file.
-    # The 'a' mode opens the file for appending.
-    with open(file_path, mode="a") as file:
-        file.write(f"{current_time}, {formatted_data}\n")
-
-# --- MQTT Client Setup ---
-# Create a new MQTT client instance.
-client = paho.Client()
-# Assign callback functions for message reception and subscription confirmation.
-client.on_message = on_message
-client.on_subscribe = on_subscribe
-# Connect to the MQTT broker (local host in this case) with a keepalive interval of 60 seconds.
-client.connect("127.0.0.1", 1883, 60)
-# Start a new thread to handle MQTT network traffic (sending/receiving messages).
-client.loop_start()
-
-# --- User Instructions ---
-# Print instructions to the console for how to use the joystick to control subscriptions.
-print("...........................Program Starts................" + "\n")
-print("....Use the Joystick to Subscribe a topic......: " + "\n")
-print("Joystick control: Up will show you a Temperature Topic")
-print("Joystick control: Down will show you a Pressure Topic ")
-print("Joystick control: Left will show you a Humidity Topic")
-print("Joystick control: Right will show you a Magnetometer Topic" + "\n")
-
-# Variable to track whether data publishing (from this script) should be active.
-# This script primarily subscribes, but also publishes sensor data when a topic is selected.
-data_publishing = False
-
-# --- Main Program Loop ---
-try:
-    # Infinite loop to continuously monitor joystick events and publish data if enabled.
-    while True:
-        # Iterate through all joystick events that have occurred.
-        for event in sense.stick.get_events():
-            # Check the direction of the joystick event.
-            if event.direction == 'up':
-                print("Joystick button UP pressed and released. Subscribing to Temperature Topic.")
-                sense.show_letter("U", text_colour=yellow) # Display 'U' on LED matrix
-                client.subscribe("TempeTopic") # Subscribe to Temperature topic
-                # Unsubscribe from other topics to ensure only one is active at a time.
-                client.unsubscribe("PressureTopic")
-                client.unsubscribe("HumidityTopic")
-                client.unsubscribe("MagnetometerTopic")
-                data_publishing = True  # Enable data publishing from this script
-
-            elif event.direction == 'down':
-                print("Joystick button DOWN pressed and released. Subscribing to Pressure Topic.")
-                sense.show_letter("D", text_colour=blue) # Display 'D' on LED matrix
-                client.subscribe("PressureTopic") # Subscribe to Pressure topic
-                client.unsubscribe("TempeTopic")
-                client.unsubscribe("HumidityTopic")
-                client.unsubscribe("MagnetometerTopic")
-                data_publishing = True  # Enable data publishing
-
-            elif event.direction == 'left':
-                print("Joystick button LEFT pressed and released. Subscribing to Humidity Topic.")
-                sense.show_letter("L", text_colour=green) # Display 'L' on LED matrix
-                client.subscribe("HumidityTopic") # Subscribe to Humidity topic
-                client.unsubscribe("TempeTopic")
-                client.unsubscribe("PressureTopic")
-                client.unsubscribe("MagnetometerTopic")
-                data_publishing = True  # Enable data publishing
-
-            elif event.direction == 'right':
-                print("Joystick button RIGHT pressed and released. Subscribing to Magnetometer Topic.")
-                sense.show_letter("R", text_colour=red) # Display 'R' on LED matrix
-                client.subscribe("MagnetometerTopic") # Subscribe to Magnetometer topic
-                client.unsubscribe("TempeTopic")
-                client.unsubscribe("PressureTopic")
-                client.unsubscribe("HumidityTopic")
-                data_publishing = True  # Enable data publishing
-
-            elif event.direction == 'middle':
-                print("Joystick button MIDDLE pressed and released. Unsubscribing from all topics.")
-                sense.show_letter("M", text_colour=red, back_colour=white) # Display 'M' on LED matrix
-                # Unsubscribe from all known topics.
-                client.unsubscribe("TempeTopic")
-                client.unsubscribe("PressureTopic")
-                client.unsubscribe("HumidityTopic")
-                client.unsubscribe("MagnetometerTopic")
-                data_publishing = False  # Disable data publishing
-
-        # If data publishing is enabled (i.e., a sensor topic is selected via joystick).
-        if data_publishing:
-            # Define local helper functions to get current sensor readings.
-            # These are defined within the loop to ensure they use the latest Sense HAT state.
-            def get_pressure():
-                return round(sense.get_pressure(), 2)
-
-            def get_temperature():
-                htemp = sense.get_temperature()
-                ptemp = sense.get_temperature_from_pressure()
-                return round((htemp + ptemp) / 2, 2)
-
-            def get_compass():
-                return round(sense.get_compass(), 2)
-
-            def get_humidity():
-                return round(sense.get_humidity(), 2)
-
-            # Read current sensor data.
-            temperature = get_temperature()
-            humidity = get_humidity()
-            pressure = get_pressure()
-            magnetometer = get_compass()
-
-            # Publish the current sensor data to their respective topics.
-            # Note: This script both subscribes to and publishes to these topics.
-            client.publish("TempeTopic", temperature)
-            client.publish("HumidityTopic", humidity)
-            client.publish("PressureTopic", pressure)
-            client.publish("MagnetometerTopic", magnetometer)
-
-            # Display the published data to the console.
-            print(f"Published: Temperature={temperature:.2f}, Humidity={humidity:.2f}, Barometric pressure={pressure:.2f}, Magnetometer={magnetometer:.2f}")
-
-            # Wait for 1 second before the next publishing cycle.
-            time.sleep(1)
-
-except KeyboardInterrupt:
-    # Handle KeyboardInterrupt (Ctrl+C) to gracefully exit the program.
-    print("Exiting...")
-finally:
-    # Disconnect the MQTT client from the broker.
-    client.disconnect()
-
-
-
-
-
+    global sense, client, writer
+    load_dependencies()
+
+    # --- Sense HAT Initialization ---
+    # Create an instance of Sense HAT.
+    # A shared Sense HAT can be passed in, so that several modes can use one sensor reader.
+    sense = hat if hat is not None else SenseHat()
+    # Clear the LED display, turning all pixels off.
+    sense.clear()
+
+    # Ensure the CSV directory exists. If not, create it.
+    if not os.path.exists(csv_directory):
+        os.makedirs(csv_directory)
+        print(f"Directory created: {csv_directory}")
+    else:
+        print(f"Directory already exists: {csv_directory}")
+
+    # Start the writer processes that append the received data to the CSV files.
+    # Rows are formatted by shardwriter.format_row, e.g. "1714557600123456789, 23.45".
+    writer = ShardedWriter(csv_directory, workers=writer_processes, echo=print_rows,
+                           topics=list(csv_files) + [f"{batch_topic}/{metric}" for metric in batch_csv_files])
+
+    # --- MQTT Client Setup ---
+    # Create a new MQTT client instance.
+    client = paho.Client()
+    # Assign callback functions for message reception and subscription confirmation.
+    client.on_message = on_message
+    client.on_subscribe = on_subscribe
+    # Connect to the MQTT broker (local host by default) with a keepalive interval of 60 seconds.
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    # Start a new thread to handle MQTT network traffic (sending/receiving messages).
+    client.loop_start()
+    # Batches carry every sensor and are logged to their own files, so their topic stays subscribed.
+    client.subscribe(batch_topic)
+
+    # --- User Instructions ---
+    # Print instructions to the console for how to use the joystick to control subscriptions.
+    print("...........................Program Starts................" + "\n")
+    print("....Use the Joystick to Subscribe a topic......: " + "\n")
+    print("Joystick control: Up will show you a Temperature Topic")
+    print("Joystick control: Down will show you a Pressure Topic ")
+    print("Joystick control: Left will show you a Humidity Topic")
+    print("Joystick control: Right will show you a Magnetometer Topic" + "\n")
+
+    # Variable to track whether data publishing (from this script) should be active.
+    # This script primarily subscribes, but also publishes sensor data when a topic is selected.
+    data_publishing = False
+
+    # --- Main Program Loop ---
+    try:
+        # Infinite loop to continuously monitor joystick events and publish data if enabled.
+        while True:
+            # Iterate through all joystick events that have occurred.
+            for event in sense.stick.get_events():
+                # Check the direction of the joystick event.
+                if event.direction == 'up':
+                    print("Joystick button UP pressed and released. Subscribing to Temperature Topic.")
+                    sense.show_letter("U", text_colour=yellow) # Display 'U' on LED matrix
+                    client.subscribe("TempeTopic") # Subscribe to Temperature topic
+                    # Unsubscribe from other topics to ensure only one is active at a time.
+                    client.unsubscribe("PressureTopic")
+                    client.unsubscribe("HumidityTopic")
+                    client.unsubscribe("MagnetometerTopic")
+                    data_publishing = True  # Enable data publishing from this script
+
+                elif event.direction == 'down':
+                    print("Joystick button DOWN pressed and released. Subscribing to Pressure Topic.")
+                    sense.show_letter("D", text_colour=blue) # Display 'D' on LED matrix
+                    client.subscribe("PressureTopic") # Subscribe to Pressure topic
+                    client.unsubscribe("TempeTopic")
+                    client.unsubscribe("HumidityTopic")
+                    client.unsubscribe("MagnetometerTopic")
+                    data_publishing = True  # Enable data publishing
+
+                elif event.direction == 'left':
+                    print("Joystick button LEFT pressed and released. Subscribing to Humidity Topic.")
+                    sense.show_letter("L", text_colour=green) # Display 'L' on LED matrix
+                    client.subscribe("HumidityTopic") # Subscribe to Humidity topic
+                    client.unsubscribe("TempeTopic")
+                    client.unsubscribe("PressureTopic")
+                    client.unsubscribe("MagnetometerTopic")
+                    data_publishing = True  # Enable data publishing
+
+                elif event.direction == 'right':
+                    print("Joystick button RIGHT pressed and released. Subscribing to Magnetometer Topic.")
+                    sense.show_letter("R", text_colour=red) # Display 'R' on LED matrix
+                    client.subscribe("MagnetometerTopic") # Subscribe to Magnetometer topic
+                    client.unsubscribe("TempeTopic")
+                    client.unsubscribe("PressureTopic")
+                    client.unsubscribe("HumidityTopic")
+                    data_publishing = True  # Enable data publishing
+
+                elif event.direction == 'middle':
+                    print("Joystick button MIDDLE pressed and released. Unsubscribing from all topics.")
+                    sense.show_letter("M", text_colour=red, back_colour=white) # Display 'M' on LED matrix
+                    # Unsubscribe from all known topics.
+                    client.unsubscribe("TempeTopic")
+                    client.unsubscribe("PressureTopic")
+                    client.unsubscribe("HumidityTopic")
+                    client.unsubscribe("MagnetometerTopic")
+                    data_publishing = False  # Disable data publishing
+
+            # If data publishing is enabled (i.e., a sensor topic is selected via joystick).
+            if data_publishing:
+                # Define local helper functions to get current sensor readings.
+                # These are defined within the loop to ensure they use the latest Sense HAT state.
+                def get_pressure():
+                    return round(sense.get_pressure(), 2)
+
+                def get_temperature():
+                    htemp = sense.get_temperature()
+                    ptemp = sense.get_temperature_from_pressure()
+                    return round((htemp + ptemp) / 2, 2)
+
+                def get_compass():
+                    return round(sense.get_compass(), 2)
+
+                def get_humidity():
+                    return round(sense.get_humidity(), 2)
+
+                # Read current sensor data, stamped with the read time in nanoseconds since the epoch
+                # (the time of the sampler's snapshot when the Sense HAT is shared).
+                read_ns = clock.read_ns(sense)
+                temperature = get_temperature()
+                humidity = get_humidity()
+                pressure = get_pressure()
+                magnetometer = get_compass()
+
+                # Publish the current sensor data and its read time to their respective topics,
+                # e.g. {"value": 21.5, "ts": 1714557600123456789}.
+                # Note: This script both subscribes to and publishes to these topics.
+                client.publish("TempeTopic", clock.encode_reading("value", temperature, read_ns))
+                client.publish("HumidityTopic", clock.encode_reading("value", humidity, read_ns))
+                client.publish("PressureTopic", clock.encode_reading("value", pressure, read_ns))
+                client.publish("MagnetometerTopic", clock.encode_reading("value", magnetometer, read_ns))
+
+                # Display the published data to the console.
+                print(f"Published: Temperature={temperature:.2f}, Humidity={humidity:.2f}, Barometric pressure={pressure:.2f}, Magnetometer={magnetometer:.2f}")
+
+                # Wait for 1 second before the next publishing cycle.
+                time.sleep(1)
+            else:
+                # Poll the joystick ten times a second while idle instead of spinning the CPU.
+                time.sleep(0.1)
+
+    except KeyboardInterrupt:
+        # Handle KeyboardInterrupt (Ctrl+C) to gracefully exit the program.
+        print("Exiting...")
+    finally:
+        # Disconnect the MQTT client from the broker and stop its network thread.
+        client.disconnect()
+        client.loop_stop()
+        # Write the data still queued and stop the writer processes.
+        writer.close()
+
+if __name__ == "__main__":
+    main()
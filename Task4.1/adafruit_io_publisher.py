@@ -1,30 +1,37 @@
 import os
-from sense_hat import SenseHat
-from Adafruit_IO import Client, Feed, Data
+import sys
 import time
 
-# --- Environment Variable Loading ---
-# Import load_dotenv from the dotenv library to load environment variables from a .env file.
-from dotenv import load_dotenv
-# Load environment variables from the .env file.
-# This allows sensitive information like API keys to be kept out of the source code.
-load_dotenv()
+# Make the sensehat_iot package in the project root importable when this script is run directly.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
 # --- Adafruit IO Settings ---
-# Retrieve Adafruit IO username and key from environment variables.
-# These should be defined in a .env file in the project root.
-ADAFRUIT_IO_USERNAME = os.getenv('ADAFRUIT_IO_USERNAME')
-ADAFRUIT_IO_KEY = os.getenv('ADAFRUIT_IO_KEY')
-
-# Initialize Adafruit IO client.
-# This client object is used to interact with the Adafruit IO platform (e.g., sending data).
-aio = Client(ADAFRUIT_IO_USERNAME, ADAFRUIT_IO_KEY)
-
-# --- Sense HAT Initialization ---
-# Create an instance of Sense HAT.
-sense = SenseHat()
-# Clear the LED display, turning all pixels off.
-sense.clear()
+# The Adafruit IO username and key are read from environment variables in main(),
+# after the .env file has been loaded.
+ADAFRUIT_IO_USERNAME = None
+ADAFRUIT_IO_KEY = None
+# Base URL of the Adafruit IO REST API.
+# Point this at a local stub HTTP server (e.g. "http://127.0.0.1:8080") for testing.
+ADAFRUIT_IO_BASE_URL = 'https://io.adafruit.com'
+
+# The Adafruit IO client and Sense HAT objects are created in main() so that
+# importing this module has no side effects.
+aio = None
+sense = None
+
+def load_dependencies():
+    """
+    Imports the Sense HAT, Adafruit IO, dotenv and clock modules needed by this mode.
+    The imports are deferred so that the module can be loaded without them.
+    """
+    global SenseHat, Client, Data, load_dotenv, clock
+    from sense_hat import SenseHat
+    from Adafruit_IO import Client, Data
+    from sensehat_iot import clock
+    # load_dotenv loads environment variables from a .env file.
+    from dotenv import load_dotenv
 
 # --- Adafruit IO Feed Names ---
 # Define a dictionary mapping internal sensor names to their corresponding Adafruit IO feed keys.
@@ -78,32 +85,64 @@ def get_humidity():
     humidity = round(humidity, 2)
     return humidity
 
-# --- Main Loop for Data Publishing ---
-# This loop continuously reads sensor data and publishes it to Adafruit IO.
-while True:
-    # Read current sensor data.
-    barometric_pressure = get_barometric_pressure()
-    temperature = get_temperature()
-    magnetometer = get_compass()
-    humidity = get_humidity()
-
-    # Get current timestamp for console output.
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    # Print all sensor data to the console for monitoring.
-    print(f"{timestamp} - barometric pressure: {barometric_pressure:.2f} hPa, temperature: {temperature:.2f} degree Celsius,"
-          f"Magnetometer: {magnetometer:.2f} degrees, Humidity: {humidity:.2f} %")
-
-    # Send each sensor data point to its corresponding Adafruit IO feed.
-    # The aio.send() method publishes the data to the cloud.
-    aio.send(feeds['pressure'], barometric_pressure)
-    aio.send(feeds['temperature'], temperature)
-    aio.send(feeds['magnetometer'], magnetometer)
-    aio.send(feeds['humidity'], humidity)
-
-    # Wait for 15 seconds before the next cycle of reading and publishing.
-    # This interval controls the data update frequency on Adafruit IO.
-    time.sleep(15)
-
-    
-
-
+def main(hat=None):
+    """
+    Continuously reads the sensors and publishes the readings to Adafruit IO every 15 seconds.
+    :param hat: A SenseHat-like object to use instead of opening the hardware (e.g. one shared by the sampler).
+    """
+    global ADAFRUIT_IO_USERNAME, ADAFRUIT_IO_KEY, ADAFRUIT_IO_BASE_URL, aio, sense
+    load_dependencies()
+
+    # --- Environment Variable Loading ---
+    # Load environment variables from the .env file.
+    # This allows sensitive information like API keys to be kept out of the source code.
+    load_dotenv()
+    # Retrieve Adafruit IO username and key from environment variables.
+    # These should be defined in a .env file in the project root.
+    ADAFRUIT_IO_USERNAME = os.getenv('ADAFRUIT_IO_USERNAME')
+    ADAFRUIT_IO_KEY = os.getenv('ADAFRUIT_IO_KEY')
+    ADAFRUIT_IO_BASE_URL = os.getenv('ADAFRUIT_IO_BASE_URL', ADAFRUIT_IO_BASE_URL)
+
+    # Initialize Adafruit IO client.
+    # This client object is used to interact with the Adafruit IO platform (e.g., sending data).
+    aio = Client(ADAFRUIT_IO_USERNAME, ADAFRUIT_IO_KEY, base_url=ADAFRUIT_IO_BASE_URL)
+
+    # --- Sense HAT Initialization ---
+    # Create an instance of Sense HAT.
+    # A shared Sense HAT can be passed in, so that several modes can use one sensor reader.
+    sense = hat if hat is not None else SenseHat()
+    # Clear the LED display, turning all pixels off.
+    sense.clear()
+
+    # --- Main Loop for Data Publishing ---
+    # This loop continuously reads sensor data and publishes it to Adafruit IO.
+    while True:
+        # Read current sensor data, stamped with the read time in nanoseconds since the epoch
+        # (the time of the sampler's snapshot when the Sense HAT is shared).
+        read_ns = clock.read_ns(sense)
+        barometric_pressure = get_barometric_pressure()
+        temperature = get_temperature()
+        magnetometer = get_compass()
+        humidity = get_humidity()
+
+        # Format the read time for console output.
+        timestamp = clock.format_ns(read_ns)
+        # Print all sensor data to the console for monitoring.
+        print(f"{timestamp} - barometric pressure: {barometric_pressure:.2f} hPa, temperature: {temperature:.2f} degree Celsius,"
+              f"Magnetometer: {magnetometer:.2f} degrees, Humidity: {humidity:.2f} %")
+
+        # Send each sensor data point to its corresponding Adafruit IO feed.
+        # created_at carries the read time, so Adafruit IO records when the reading was taken
+        # rather than when it arrived.
+        created_at = clock.iso_utc(read_ns)
+        aio.create_data(feeds['pressure'], Data(value=barometric_pressure, created_at=created_at))
+        aio.create_data(feeds['temperature'], Data(value=temperature, created_at=created_at))
+        aio.create_data(feeds['magnetometer'], Data(value=magnetometer, created_at=created_at))
+        aio.create_data(feeds['humidity'], Data(value=humidity, created_at=created_at))
+
+        # Wait for 15 seconds before the next cycle of reading and publishing.
+        # This interval controls the data update frequency on Adafruit IO.
+        time.sleep(15)
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,54 @@
 import os
-from sense_hat import SenseHat
-from Adafruit_IO import Client, Feed, Data
+import sys
+import json
+import sqlite3
+import calendar
+import urllib.parse
 import time
 
-# --- Environment Variable Loading ---
-# Import load_dotenv from the dotenv library to load environment variables from a .env file.
-from dotenv import load_dotenv
-# Load environment variables from the .env file.
-# This allows sensitive information like API keys to be kept out of the source code.
-load_dotenv()
-
-# --- Sense HAT Initialization ---
-# Create an instance of Sense HAT.
-sense = SenseHat()
-# Clear the LED display, turning all pixels off.
-sense.clear()
+# Make the sensehat_iot package in the project root importable when this script is run directly.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
 # --- Adafruit IO Settings ---
-# Retrieve Adafruit IO username and key from environment variables.
-# These should be defined in a .env file in the project root.
-ADAFRUIT_IO_USERNAME = os.getenv('ADAFRUIT_IO_USERNAME')
-ADAFRUIT_IO_KEY = os.getenv('ADAFRUIT_IO_KEY')
+# The Adafruit IO settings are read from environment variables in main(),
+# after the .env file has been loaded.
+ADAFRUIT_IO_USERNAME = None
+ADAFRUIT_IO_KEY = None
+# Base URL of the Adafruit IO REST API.
+# Point this at a local stub HTTP server (e.g. "http://127.0.0.1:8080") for testing.
+ADAFRUIT_IO_BASE_URL = 'https://io.adafruit.com'
+
+# The Sense HAT object is created in main() so that importing this module has no side effects.
+sense = None
 
-# Initialize Adafruit IO client.
-# This client object is used to interact with the Adafruit IO platform (e.g., receiving data).
-aio = Client(ADAFRUIT_IO_USERNAME, ADAFRUIT_IO_KEY)
+def load_dependencies():
+    """
+    Imports the Sense HAT, dotenv and clock modules needed by this mode.
+    The imports are deferred so that the module can be loaded without them.
+    """
+    global SenseHat, load_dotenv, clock
+    from sense_hat import SenseHat
+    from sensehat_iot import clock
+    # load_dotenv loads environment variables from a .env file.
+    from dotenv import load_dotenv
+
+# --- Local Cache Settings ---
+# Path of the SQLite database that keeps the feed history between restarts.
+# It can be overridden with the ADAFRUIT_IO_CACHE environment variable.
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'adafruit_io_cache.db')
+# Version of the cache layout. A cache with an older layout is emptied and backfilled again.
+CACHE_VERSION = 2
+# How far back (in seconds) to backfill a feed that has no cached history yet.
+# Older points are removed from the cache at every sync, so it does not grow without bound.
+BACKFILL_SECONDS = 24 * 60 * 60
+# Number of data points requested per page (Adafruit IO allows at most 1000).
+PAGE_SIZE = 1000
+# Time window (in seconds) used for the trend summary printed to the console.
+TREND_SECONDS = 60 * 60
+# Seconds to wait for an HTTP response from Adafruit IO.
+HTTP_TIMEOUT = 10
 
 # --- Adafruit IO Feed Names ---
 # Define a dictionary mapping internal sensor names to their corresponding Adafruit IO feed keys.
@@ -45,6 +69,218 @@ colors = {
     'humidity': [255, 255, 0]    # Yellow for humidity
 }
 
+# --- Local Cache ---
+def open_cache(path):
+    """
+    Opens (and creates if needed) the SQLite cache of feed data.
+    Points are stored once per Adafruit IO data id and indexed by feed and time.
+    Creation times are stored as integer nanoseconds since the Unix epoch.
+    :param path: The path of the SQLite database file.
+    :return: An open sqlite3 connection.
+    """
+    db = sqlite3.connect(path)
+    if db.execute("PRAGMA user_version").fetchone()[0] < CACHE_VERSION:
+        # Version 1 stored the creation times as REAL seconds; the points are fetched again.
+        db.execute("DROP TABLE IF EXISTS feed_data")
+        db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS feed_data (
+            feed TEXT NOT NULL,
+            id TEXT NOT NULL,
+            created_ns INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (feed, id)
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS feed_data_feed_time ON feed_data (feed, created_ns)")
+    # Progress of the sync of each feed, so an interrupted backfill is resumed instead of skipped.
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS feed_sync (
+            feed TEXT PRIMARY KEY,
+            synced_ns INTEGER,
+            gap_start_ns INTEGER,
+            gap_end_ns INTEGER
+        )
+    """)
+    db.commit()
+    return db
+
+def load_sync_state(db, feed_name):
+    """
+    Returns the sync progress of a feed.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :return: A (synced_ns, gap_start_ns, gap_end_ns) tuple. synced_ns is the creation time of the newest point
+             of the last sync, and the gap is a time range still to be backfilled; each is None if there is none.
+    """
+    row = db.execute("SELECT synced_ns, gap_start_ns, gap_end_ns FROM feed_sync WHERE feed = ?",
+                     (feed_name,)).fetchone()
+    return row if row is not None else (None, None, None)
+
+def save_sync_state(db, feed_name, synced_ns, gap_start_ns=None, gap_end_ns=None):
+    """
+    Records the sync progress of a feed. The caller commits it together with the points it covers.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :param synced_ns: The creation time of the newest point of the last sync.
+    :param gap_start_ns: The start of the time range still to be backfilled (None if there is none).
+    :param gap_end_ns: The end of the time range still to be backfilled (None if there is none).
+    """
+    db.execute("INSERT OR REPLACE INTO feed_sync (feed, synced_ns, gap_start_ns, gap_end_ns) VALUES (?, ?, ?, ?)",
+               (feed_name, synced_ns, gap_start_ns, gap_end_ns))
+
+def latest_cached(db, feed_name):
+    """
+    Returns the newest cached point of a feed.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :return: A (created_ns, value) tuple, or None if the feed has no cached points.
+    """
+    return db.execute(
+        "SELECT created_ns, value FROM feed_data WHERE feed = ? ORDER BY created_ns DESC LIMIT 1",
+        (feed_name,)).fetchone()
+
+def cached_trend(db, feed_name, since_ns):
+    """
+    Summarises the cached points of a feed newer than a given time.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :param since_ns: Only points created at or after this time (nanoseconds since the epoch) are included.
+    :return: A (count, min, avg, max, first value) tuple; the values are None if there are no points.
+    """
+    count, low, mean, high = db.execute(
+        "SELECT COUNT(*), MIN(CAST(value AS REAL)), AVG(CAST(value AS REAL)), MAX(CAST(value AS REAL)) "
+        "FROM feed_data WHERE feed = ? AND created_ns >= ?",
+        (feed_name, since_ns)).fetchone()
+    first = db.execute(
+        "SELECT CAST(value AS REAL) FROM feed_data WHERE feed = ? AND created_ns >= ? "
+        "ORDER BY created_ns LIMIT 1",
+        (feed_name, since_ns)).fetchone()
+    return count, low, mean, high, first[0] if first else None
+
+# --- Adafruit IO History Fetching ---
+def point_ns(point):
+    """
+    Returns the creation time of an Adafruit IO data point in nanoseconds since the epoch.
+    Uses "created_epoch" when the API provides it and parses "created_at" otherwise.
+    :param point: A data point dictionary returned by the API.
+    :return: Nanoseconds since the epoch.
+    """
+    if point.get('created_epoch') is not None:
+        return round(float(point['created_epoch']) * clock.NS_PER_SECOND)
+    created_at = point['created_at']
+    seconds = calendar.timegm(time.strptime(created_at[:19], "%Y-%m-%dT%H:%M:%S"))
+    # Keep the fraction of a second, e.g. "2024-05-01T10:00:00.123Z".
+    fraction = created_at[20:].rstrip('Z') if created_at[19:20] == '.' else ''
+    return seconds * clock.NS_PER_SECOND + int(fraction[:9].ljust(9, '0') or 0)
+
+def fetch_page(feed_name, start_ns, end_ns=None):
+    """
+    Requests one page of feed data from the Adafruit IO REST API, newest points first.
+    :param feed_name: The Adafruit IO feed key.
+    :param start_ns: Only points created at or after this time (nanoseconds since the epoch) are returned.
+    :param end_ns: Only points created at or before this time are returned (None for no limit).
+    :return: A list of data point dictionaries.
+    """
+    # urllib.request (and ssl) is imported on first use so the cached values are displayed without waiting for it.
+    import urllib.request
+    params = {'start_time': clock.iso_utc(start_ns), 'limit': PAGE_SIZE}
+    if end_ns is not None:
+        params['end_time'] = clock.iso_utc(end_ns)
+    url = (f"{ADAFRUIT_IO_BASE_URL.rstrip('/')}/api/v2/{ADAFRUIT_IO_USERNAME}/feeds/"
+           f"{urllib.parse.quote(feed_name)}/data?{urllib.parse.urlencode(params)}")
+    request = urllib.request.Request(url, headers={'X-AIO-Key': ADAFRUIT_IO_KEY or ''})
+    with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+        return json.load(response)
+
+def store_page(db, feed_name, page):
+    """
+    Stores one page of feed data in the cache, without committing.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :param page: A list of data point dictionaries returned by the API.
+    :return: A (number of new points, list of creation times) tuple.
+    """
+    rows = [(feed_name, str(point['id']), point_ns(point), str(point['value'])) for point in page]
+    before = db.total_changes
+    db.executemany("INSERT OR IGNORE INTO feed_data (feed, id, created_ns, value) VALUES (?, ?, ?, ?)", rows)
+    return db.total_changes - before, [row[2] for row in rows]
+
+def prune_feed(db, feed_name, before_ns):
+    """
+    Removes the cached points of a feed older than a time, without committing.
+    The newest point is kept, so a feed that has not been updated for a while can still be displayed.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :param before_ns: Points created before this time (nanoseconds since the epoch) are removed.
+    :return: The number of points removed.
+    """
+    cursor = db.execute(
+        "DELETE FROM feed_data WHERE feed = ? AND created_ns < ? "
+        "AND created_ns < (SELECT MAX(created_ns) FROM feed_data WHERE feed = ?)",
+        (feed_name, before_ns, feed_name))
+    return cursor.rowcount
+
+def backfill(db, feed_name, synced_ns, start_ns, end_ns):
+    """
+    Fetches the points of a feed between two times, page by page from newest to oldest.
+    The remaining gap is committed with every page, so a failed request only loses the page being fetched.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :param synced_ns: The sync time to record with the gap.
+    :param start_ns: The start of the time range (nanoseconds since the epoch).
+    :param end_ns: The end of the time range.
+    :return: The number of new points stored.
+    """
+    stored = 0
+    while end_ns > start_ns:
+        page = fetch_page(feed_name, start_ns, end_ns)
+        inserted, times = store_page(db, feed_name, page)
+        stored += inserted
+        # A short page is the last one. The time boundaries are inclusive, so the oldest point is
+        # fetched again with the next page; a page that does not get older cannot make progress.
+        if len(page) < PAGE_SIZE or min(times) >= end_ns:
+            break
+        end_ns = min(times)
+        save_sync_state(db, feed_name, synced_ns, start_ns, end_ns)
+        db.commit()
+    save_sync_state(db, feed_name, synced_ns)
+    db.commit()
+    return stored
+
+def sync_feed(db, feed_name):
+    """
+    Brings the cache of a feed up to date.
+    A gap left by an interrupted backfill is fetched first. Then the points newer than the last sync
+    are requested, or BACKFILL_SECONDS of history for a feed that was never synced. Points older than
+    BACKFILL_SECONDS are removed in the same transaction as the newest points.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
+    :return: The number of new points stored.
+    """
+    window_start_ns = time.time_ns() - BACKFILL_SECONDS * clock.NS_PER_SECOND
+    synced_ns, gap_start_ns, gap_end_ns = load_sync_state(db, feed_name)
+
+    stored = 0
+    if gap_end_ns is not None:
+        stored += backfill(db, feed_name, synced_ns, max(gap_start_ns, window_start_ns), gap_end_ns)
+
+    start_ns = window_start_ns if synced_ns is None else max(window_start_ns, synced_ns)
+    page = fetch_page(feed_name, start_ns)
+    inserted, times = store_page(db, feed_name, page)
+    stored += inserted
+    prune_feed(db, feed_name, window_start_ns)
+    newest_ns = max(times, default=synced_ns)
+    if len(page) < PAGE_SIZE:
+        save_sync_state(db, feed_name, newest_ns)
+        db.commit()
+        return stored
+    # More points than one page: record the older part as a gap before fetching it.
+    save_sync_state(db, feed_name, newest_ns, start_ns, min(times))
+    db.commit()
+    return stored + backfill(db, feed_name, newest_ns, start_ns, min(times))
+
+# --- Display Functions ---
 def display_on_sense_hat(feed_name, value):
     """
     Displays the fetched sensor data on the Sense HAT's LED matrix.
@@ -55,62 +291,108 @@ def display_on_sense_hat(feed_name, value):
     # Display data on Sense HAT based on the feed name.
     if feed_name == feeds['pressure']:
         sense.show_message(f"BP: {value:.2f} hPa", text_colour=colors['pressure'])
-    
+
     elif feed_name == feeds['temperature']:
         sense.show_message(f"Temp: {value:.2f} degree celsius", text_colour=colors['temperature'])
-    
+
     elif feed_name == feeds['magnetometer']:
         sense.show_message(f"Mag: {value:.2f} degrees", text_colour=colors['magnetometer'])
-    
+
     elif feed_name == feeds['humidity']:
         sense.show_message(f"Hum: {value:.2f} %", text_colour=colors['humidity'])
 
-def fetch_and_display_data(feed_name):
+def display_cached(db, feed_name):
     """
-    Fetches the latest data from a specified Adafruit IO feed and displays it.
-    It handles potential errors during data reception and format conversion.
-    :param feed_name: The name of the Adafruit IO feed to fetch data from.
+    Displays the newest cached value of a feed together with its recent trend.
+    :param db: The cache connection.
+    :param feed_name: The Adafruit IO feed key.
     """
+    latest = latest_cached(db, feed_name)
+    if latest is None:
+        print(f"No cached data for {feed_name} yet.")
+        return
+
+    created_ns, data = latest
     try:
-        # Receive the latest data value from the Adafruit IO feed.
-        data = aio.receive(feed_name).value
-        # Convert the received data string to a float.
+        # Convert the cached data string to a float.
         value = float(data)
-        
-        # Get current timestamp for console output.
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        # Print the fetched data to the console.
-        print(f"{timestamp} - The value of {feed_name.capitalize()} from Adafruit is: {value:.2f}")
-        # Display the fetched data on the Sense HAT LED matrix.
-        display_on_sense_hat(feed_name, value)
-        print("Done!!!\n") # Indicate successful display.
-    
     except ValueError:
-        # Handle cases where the received data cannot be converted to a float.
+        # Handle cases where the stored data cannot be converted to a float.
         print(f"Invalid data format for {feed_name}: {data}")
-    
-    except Exception as e:
-        # Catch any other exceptions during data reception.
-        print(f"Error receiving data from {feed_name}: {e}")
+        return
 
-# --- Main Loop for Data Fetching and Display ---
-# This loop continuously fetches data from Adafruit IO feeds and displays it.
-while True:
-    # Fetch and display data for each sensor type.
-    fetch_and_display_data(feeds['pressure'])
-    fetch_and_display_data(feeds['temperature'])
-    fetch_and_display_data(feeds['magnetometer'])
-    fetch_and_display_data(feeds['humidity'])
-    
-    # Wait for 15 seconds before the next data fetch cycle.
-    # This interval controls the frequency of data updates from Adafruit IO.
-    time.sleep(15)
+    # Format the time the point was created on Adafruit IO for console output.
+    timestamp = clock.format_ns(created_ns)
+    print(f"{timestamp} - The value of {feed_name.capitalize()} from Adafruit is: {value:.2f}")
+    # Summarise the cached history so trends are visible without extra requests.
+    count, low, mean, high, first = cached_trend(db, feed_name, time.time_ns() - TREND_SECONDS * clock.NS_PER_SECOND)
+    if count:
+        print(f"    Last {TREND_SECONDS // 60} min: {count} points, min {low:.2f}, avg {mean:.2f}, "
+              f"max {high:.2f}, change {value - first:+.2f}")
+    # Display the value on the Sense HAT LED matrix.
+    display_on_sense_hat(feed_name, value)
+    print("Done!!!\n") # Indicate successful display.
 
+def fetch_and_display_data(db, feed_name):
+    """
+    Fetches the new data of a specified Adafruit IO feed into the cache and displays the latest value.
+    If the request fails, the cached value is displayed instead.
+    :param db: The cache connection.
+    :param feed_name: The name of the Adafruit IO feed to fetch data from.
+    """
+    try:
+        stored = sync_feed(db, feed_name)
+        print(f"Fetched {stored} new points for {feed_name}")
+    except (OSError, ValueError, KeyError) as e:
+        # Catch network errors (urllib.error.URLError is an OSError) and malformed responses;
+        # the cache is still displayed.
+        print(f"Error receiving data from {feed_name}: {e}")
+    display_cached(db, feed_name)
 
+def main(hat=None):
+    """
+    Displays the cached feed values, then keeps the cache up to date and displays the new values every 15 seconds.
+    :param hat: A SenseHat-like object to use instead of opening the hardware (e.g. one shared by the sampler).
+    """
+    global ADAFRUIT_IO_USERNAME, ADAFRUIT_IO_KEY, ADAFRUIT_IO_BASE_URL, CACHE_PATH, sense
+    load_dependencies()
 
+    # --- Environment Variable Loading ---
+    # Load environment variables from the .env file.
+    # This allows sensitive information like API keys to be kept out of the source code.
+    load_dotenv()
+    # Retrieve Adafruit IO settings from environment variables.
+    # These should be defined in a .env file in the project root.
+    ADAFRUIT_IO_USERNAME = os.getenv('ADAFRUIT_IO_USERNAME')
+    ADAFRUIT_IO_KEY = os.getenv('ADAFRUIT_IO_KEY')
+    ADAFRUIT_IO_BASE_URL = os.getenv('ADAFRUIT_IO_BASE_URL', ADAFRUIT_IO_BASE_URL)
+    CACHE_PATH = os.getenv('ADAFRUIT_IO_CACHE', CACHE_PATH)
 
+    # --- Sense HAT Initialization ---
+    # Create an instance of Sense HAT.
+    # A shared Sense HAT can be passed in, so that several modes can use one sensor reader.
+    sense = hat if hat is not None else SenseHat()
+    # Clear the LED display, turning all pixels off.
+    sense.clear()
 
+    # --- Main Loop for Data Fetching and Display ---
+    cache = open_cache(CACHE_PATH)
 
+    # Show the cached values straight away, before any request to Adafruit IO.
+    for feed_name in feeds.values():
+        display_cached(cache, feed_name)
 
+    # This loop continuously fetches new data from Adafruit IO feeds and displays it.
+    while True:
+        # Fetch and display data for each sensor type.
+        fetch_and_display_data(cache, feeds['pressure'])
+        fetch_and_display_data(cache, feeds['temperature'])
+        fetch_and_display_data(cache, feeds['magnetometer'])
+        fetch_and_display_data(cache, feeds['humidity'])
 
+        # Wait for 15 seconds before the next data fetch cycle.
+        # This interval controls the frequency of data updates from Adafruit IO.
+        time.sleep(15)
 
+if __name__ == "__main__":
+    main()
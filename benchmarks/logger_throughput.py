@@ -0,0 +1,155 @@
+"""
+Throughput benchmark for the logger's sharded CSV writer.
+
+A publisher sends --messages messages spread over --topics topics to a local MQTT
+broker as fast as it can. A subscriber decodes each reading and hands it to the
+writer, exactly like the Task3 logger's on_message. The benchmark reports messages
+per second, from the first received message until every row is on disk, for each
+worker count. The "sync" row is the old behaviour: one open/append/close per message
+in the network thread.
+
+Requires a broker on --broker/--port (e.g. `sudo apt install mosquitto`). With
+--direct the broker is skipped and messages are submitted straight to the writer,
+which measures the writer on its own.
+
+Usage:
+    python3 benchmarks/logger_throughput.py [--messages 50000] [--topics 16] [--workers 1 2 4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import clock  # noqa: E402
+from sensehat_iot.shardwriter import ShardedWriter, format_row  # noqa: E402
+
+# Seconds without a new message after which the subscriber stops waiting for the rest.
+IDLE_TIMEOUT = 5.0
+
+class SyncWriter:
+    """
+    The logger's previous behaviour: every message is appended in the calling thread.
+    """
+
+    def __init__(self, directory, format_row):
+        self.directory = directory
+        self.format_row = format_row
+
+    def submit(self, topic, title, timestamp, value):
+        with open(os.path.join(self.directory, title), mode="a", encoding="utf-8") as file:
+            file.write(self.format_row(timestamp, value))
+
+    def close(self):
+        pass
+
+def count_rows(directory):
+    """
+    Counts the rows written to all CSV files in a directory.
+    :param directory: The directory to count.
+    :return: The total number of lines.
+    """
+    total = 0
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), 'rb') as file:
+            total += sum(1 for _ in file)
+    return total
+
+def run_direct(writer, topics, messages):
+    """
+    Submits messages straight to the writer, without a broker.
+    :return: A (number of messages submitted, start time) tuple.
+    """
+    start = time.monotonic()
+    for index in range(messages):
+        topic = topics[index % len(topics)]
+        writer.submit(topic, topic.replace('/', '_') + '.csv', clock.now_ns(), index % 1000 / 10)
+    return messages, start
+
+def run_broker(writer, topics, messages, broker, port):
+    """
+    Publishes messages through the broker and submits each received message to the writer.
+    :return: A (number of messages received, time of the first receipt) tuple.
+    """
+    import paho.mqtt.client as mqtt
+
+    received = [0]
+    first_receipt = [None]
+    last_receipt = [time.monotonic()]
+    done = threading.Event()
+
+    def on_message(client, userdata, msg):
+        if first_receipt[0] is None:
+            first_receipt[0] = time.monotonic()
+        value, ns = clock.decode_reading(msg.payload)
+        writer.submit(msg.topic, msg.topic.replace('/', '_') + '.csv', ns, value)
+        received[0] += 1
+        last_receipt[0] = time.monotonic()
+        if received[0] == messages:
+            done.set()
+
+    subscriber = mqtt.Client(protocol=mqtt.MQTTv5)
+    subscriber.on_message = on_message
+    subscriber.connect(broker, port, 60)
+    subscriber.subscribe('bench/logger/#', qos=0)
+    subscriber.loop_start()
+    # Give the broker time to register the subscription.
+    time.sleep(0.5)
+
+    publisher = mqtt.Client(protocol=mqtt.MQTTv5)
+    publisher.connect(broker, port, 60)
+    publisher.loop_start()
+    for index in range(messages):
+        payload = clock.encode_reading('value', index % 1000 / 10, clock.now_ns())
+        info = publisher.publish(topics[index % len(topics)], payload, qos=0)
+        if index % 1000 == 999:
+            info.wait_for_publish()
+    info.wait_for_publish()
+
+    while not done.wait(0.5):
+        if time.monotonic() - last_receipt[0] > IDLE_TIMEOUT:
+            break
+    subscriber.loop_stop()
+    subscriber.disconnect()
+    publisher.loop_stop()
+    publisher.disconnect()
+    return received[0], first_receipt[0] or time.monotonic()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--broker', default='127.0.0.1', help='MQTT broker address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=1883, help='MQTT broker port (default: 1883)')
+    parser.add_argument('--messages', type=int, default=50000, help='messages per run (default: 50000)')
+    parser.add_argument('--topics', type=int, default=16, help='number of topics (default: 16)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='worker counts to test (default: 1 2 4)')
+    parser.add_argument('--direct', action='store_true', help='submit to the writer directly instead of through the broker')
+    args = parser.parse_args()
+
+    topics = [f'bench/logger/sensor{index}' for index in range(args.topics)]
+
+    print(f"{'writer':<10} {'messages':>9} {'rows':>9} {'seconds':>8} {'messages/s':>11}")
+    for workers in ['sync'] + args.workers:
+        directory = tempfile.mkdtemp(prefix='logger-bench-')
+        try:
+            if workers == 'sync':
+                writer = SyncWriter(directory, format_row)
+            else:
+                writer = ShardedWriter(directory, format_row, workers, topics)
+            if args.direct:
+                count, start = run_direct(writer, topics, args.messages)
+            else:
+                count, start = run_broker(writer, topics, args.messages, args.broker, args.port)
+            writer.close()
+            elapsed = time.monotonic() - start
+            rows = count_rows(directory)
+            label = workers if workers == 'sync' else f'{workers} proc'
+            print(f"{label:<10} {count:>9} {rows:>9} {elapsed:>8.2f} {count / elapsed:>11.0f}")
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Size and CPU cost of the uplink payload encodings.
+
+Simulated Sense HAT readings (the publisher's four metrics once per second, with a
+few milliseconds of jitter on the read time) are encoded in batches of --rounds
+sampling rounds. For each batch size and encoding the benchmark reports the bytes
+per sample on the wire (MQTT payload only) and the CPU time to encode and decode
+one sample. "json" is one payload per reading, as published without batching.
+Every batch is decoded again and checked against the original readings.
+
+With --print-dictionary, a new dictionary is built from simulated batches and
+printed as a Python literal for sensehat_iot.batchcodec.DICTIONARIES. Give it a new
+id: subscribers need the old dictionaries to decode payloads that use them.
+
+Usage:
+    python3 benchmarks/payload_compression.py [--rounds 1 10 60 300] [--batches 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import batchcodec, clock  # noqa: E402
+from sensehat_iot.soak import FakeSenseHat  # noqa: E402
+
+# Minimum CPU seconds spent measuring each encoding, to average out timer resolution.
+MIN_CPU_SECONDS = 0.2
+
+def simulate_readings(rounds, seed, start_ns):
+    """
+    Simulates the readings of the Task2 publisher.
+    :param rounds: Number of sampling rounds.
+    :param seed: Seed of the random walk.
+    :param start_ns: Read time of the first round, in nanoseconds since the epoch.
+    :return: A list of (nanoseconds, metric, value) tuples, four per round.
+    """
+    hat = FakeSenseHat(seed)
+    readings = []
+    ns = start_ns
+    for _ in range(rounds):
+        temperature = (hat.get_temperature() + hat.get_temperature_from_pressure()) / 2
+        for metric, value in (('temperature', temperature), ('humidity', hat.get_humidity()),
+                              ('pressure', hat.get_pressure()), ('magnetometer', hat.get_compass())):
+            readings.append((ns, metric, round(value, 2)))
+        ns += clock.NS_PER_SECOND + hat.random.randrange(3_000_000)
+    return readings
+
+def encodings():
+    """
+    :return: A list of (label, encode, decode) tuples; encode turns a batch into a list of payloads.
+    """
+    per_reading = ('json', lambda readings: [clock.encode_reading(metric, value, ns) for ns, metric, value in readings],
+                   lambda payloads: [clock.decode_reading(payload) for payload in payloads])
+    result = [per_reading]
+    for codec in batchcodec.available_codecs():
+        for dictionary_id in ((0,) if codec == 'none' else (0, batchcodec.DEFAULT_DICTIONARY)):
+            label = codec + ('+dict' if dictionary_id else '')
+
+            def encode(readings, codec=codec, dictionary_id=dictionary_id):
+                return [batchcodec.encode_batch(readings, codec, dictionary_id)]
+
+            result.append((label, encode, lambda payloads: batchcodec.decode_batch(payloads[0])))
+    return result
+
+def cpu_seconds(function, argument):
+    """
+    Measures the CPU time of one call, repeating it until MIN_CPU_SECONDS have been spent.
+    :return: The average CPU seconds per call.
+    """
+    calls = 0
+    start = time.process_time()
+    while True:
+        function(argument)
+        calls += 1
+        elapsed = time.process_time() - start
+        if elapsed >= MIN_CPU_SECONDS:
+            return elapsed / calls
+
+def print_dictionary(size):
+    """
+    Builds a dictionary from small simulated batches and prints it as a Python literal.
+    Small batches are where a dictionary helps most; the single-round ones come last,
+    where they are the cheapest to refer to.
+    :param size: The maximum size of the dictionary in bytes.
+    """
+    now = clock.now_ns()
+    bodies = [batchcodec.encode_columns(simulate_readings(rounds, seed, now)) for rounds, seed in ((3, 1), (1, 2), (1, 3))]
+    dictionary = batchcodec.train_dictionary(bodies, size)
+    print(f"# {len(dictionary)} bytes")
+    print("(")
+    for start in range(0, len(dictionary), 88):
+        print(f"    {dictionary[start:start + 88]!r}")
+    print(")")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[1, 10, 60, 300],
+                        help='sampling rounds per batch (default: 1 10 60 300)')
+    parser.add_argument('--batches', type=int, default=20, help='batches per batch size (default: 20)')
+    parser.add_argument('--print-dictionary', action='store_true', help='print a new dictionary and exit')
+    parser.add_argument('--dictionary-size', type=int, default=batchcodec.DICTIONARY_SIZE,
+                        help=f'size of a new dictionary in bytes (default: {batchcodec.DICTIONARY_SIZE})')
+    args = parser.parse_args()
+
+    if args.print_dictionary:
+        print_dictionary(args.dictionary_size)
+        return
+
+    print(f"{'rounds':>6} {'encoding':<10} {'bytes/sample':>12} {'encode us/sample':>17} {'decode us/sample':>17}")
+    for rounds in args.rounds:
+        # Seeds differ from the ones used to build the dictionary.
+        start = clock.now_ns()
+        batches = [simulate_readings(rounds, 100 + index, start) for index in range(args.batches)]
+        samples = rounds * 4 * args.batches
+        for label, encode, decode in encodings():
+            payloads = [encode(batch) for batch in batches]
+            if label != 'json':
+                for batch, encoded in zip(batches, payloads):
+                    if decode(encoded) != batch:
+                        raise SystemExit(f"{label}: decoded batch differs from the original readings")
+            size = sum(len(payload) for encoded in payloads for payload in encoded)
+            encode_seconds = cpu_seconds(lambda items: [encode(batch) for batch in items], batches)
+            decode_seconds = cpu_seconds(lambda items: [decode(encoded) for encoded in items], payloads)
+            print(f"{rounds:>6} {label:<10} {size / samples:>12.1f} "
+                  f"{encode_seconds / samples * 1e6:>17.2f} {decode_seconds / samples * 1e6:>17.2f}")
+
+if __name__ == '__main__':
+    main()
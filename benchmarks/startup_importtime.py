@@ -0,0 +1,124 @@
+"""
+Startup-time benchmark for every mode of ``python3 -m sensehat_iot``.
+
+Each mode is started with ``python3 -X importtime -m sensehat_iot <mode> --import-only``,
+which loads the mode and its dependencies and then exits. The import time reported
+by Python is summed per run, and the median over several runs is recorded.
+
+Results are appended to startup_importtime.jsonl (one JSON line per benchmark run)
+so that startup time can be tracked over time. The file is ignored by git: its
+timings are only comparable between runs on the same host. The run fails (exit code 1) if a
+headless mode imports matplotlib, or if a mode is more than --tolerance slower than
+the previous run recorded on the same host.
+
+Usage:
+    python3 benchmarks/startup_importtime.py [--runs 5] [--tolerance 0.25] [--no-save]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_importtime.jsonl')
+
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot.cli import MODES  # noqa: E402
+
+# Modes that need a display; every other mode must start without matplotlib.
+GUI_MODES = {'plot'}
+
+def measure(mode):
+    """
+    Starts one mode with -X importtime and parses the import timings it reports.
+    :param mode: The name of the mode.
+    :return: A (total import time in ms, set of imported module names) tuple.
+    :raises RuntimeError: If the mode fails to start.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'sensehat_iot', mode, '--import-only'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+        raise RuntimeError(f"exit code {result.returncode}: {last_line}")
+
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       123 |        456 |   package.module".
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        modules.add(name.strip())
+    return total_us / 1000, modules
+
+def previous_results(host):
+    """
+    Returns the most recent recorded results for a host.
+    :param host: The host name the results were recorded on.
+    :return: A dictionary of mode -> result, or an empty dictionary.
+    """
+    if not os.path.exists(HISTORY_PATH):
+        return {}
+    latest = {}
+    with open(HISTORY_PATH) as history:
+        for line in history:
+            entry = json.loads(line)
+            if entry.get('host') == host:
+                latest = entry['modes']
+    return latest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='number of runs per mode (default: 5)')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown relative to the previous run on this host (default: 0.25)')
+    parser.add_argument('--no-save', action='store_true', help='do not append the results to the history file')
+    args = parser.parse_args()
+
+    host = platform.node()
+    previous = previous_results(host)
+    results = {}
+    failed = False
+
+    print(f"{'mode':<15} {'median ms':>10} {'modules':>8}  notes")
+    for mode in MODES:
+        try:
+            runs = [measure(mode) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{mode:<15} {'-':>10} {'-':>8}  failed to start ({e})")
+            failed = True
+            continue
+
+        median_ms = statistics.median(total for total, _ in runs)
+        modules = runs[-1][1]
+        notes = []
+        if mode not in GUI_MODES and any(name.split('.')[0] == 'matplotlib' for name in modules):
+            notes.append('imports matplotlib in a headless mode')
+            failed = True
+        if mode in previous and median_ms > previous[mode]['median_ms'] * (1 + args.tolerance):
+            notes.append(f"slower than previous {previous[mode]['median_ms']:.1f} ms")
+            failed = True
+        results[mode] = {'median_ms': round(median_ms, 2), 'modules': len(modules)}
+        print(f"{mode:<15} {median_ms:>10.1f} {len(modules):>8}  {'; '.join(notes)}")
+
+    if results and not args.no_save:
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': host,
+            'python': platform.python_version(),
+            'modes': results,
+        }
+        with open(HISTORY_PATH, 'a') as history:
+            history.write(json.dumps(entry) + '\n')
+        print(f"Results appended to {HISTORY_PATH}")
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+Single entry point for the Raspberry Pi 5 / Sense HAT IoT system.
+
+Run ``python3 -m sensehat_iot <mode>`` from the project root, where <mode> is one of
+display, publish, plot, log, cloud-publish or cloud-display. The tools around them are
+run the same way: sampler (share one sensor reader between modes), replay (re-publish
+the logger's CSV files), serve (HTTP query API over them) and soak (long-run test of a
+mode under a virtual clock).
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from sensehat_iot.cli import main
+
+sys.exit(main())
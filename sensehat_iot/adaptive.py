@@ -0,0 +1,140 @@
+"""
+Adaptive per-metric sampling on top of the sensor getters.
+
+Each metric has its own sampling interval. When a metric changes quickly, or its
+recent readings vary more than a threshold, it is sampled at the ceiling rate
+straight away. While it stays flat, its interval doubles (by default) after every
+reading until it reaches the floor rate. This saves sensor reads, CPU time and
+uplink traffic in a steady environment without missing fast changes.
+"""
+import statistics
+from collections import deque
+
+# Number of recent readings used to compute the variability of a metric.
+DEFAULT_WINDOW = 5
+# Factor the interval is multiplied by after every flat reading.
+DEFAULT_BACKOFF = 2.0
+
+class MetricSchedule:
+    """
+    Sampling state of one metric.
+    """
+
+    def __init__(self, getter, change_threshold, spread_threshold, circular, window):
+        """
+        :param getter: A function returning the current reading.
+        :param change_threshold: Rate of change (units per second) above which the metric is "active".
+        :param spread_threshold: Standard deviation of the recent readings above which the metric is "active".
+        :param circular: True for angles in degrees, whose readings wrap around at 360.
+        :param window: Number of recent readings kept.
+        """
+        self.getter = getter
+        self.change_threshold = change_threshold
+        self.spread_threshold = spread_threshold
+        self.circular = circular
+        self.readings = deque(maxlen=window)  # (time, value)
+        self.interval = None
+        self.next_due = 0.0
+        self.count = 0
+
+    def difference(self, a, b):
+        """
+        Returns the signed difference a - b, taking the 0/360 wrap-around into account for angles.
+        """
+        delta = a - b
+        if self.circular:
+            delta = (delta + 180) % 360 - 180
+        return delta
+
+    def is_active(self):
+        """
+        Decides whether the metric is changing, from its recent readings.
+        :return: True if the rate of change or the spread of the readings is above its threshold.
+        """
+        if len(self.readings) < 2:
+            return True
+        (previous_time, previous), (last_time, last) = self.readings[-2], self.readings[-1]
+        elapsed = last_time - previous_time
+        if elapsed > 0 and abs(self.difference(last, previous)) / elapsed > self.change_threshold:
+            return True
+        # Measure the spread relative to the last reading so angles near 0/360 are handled.
+        offsets = [self.difference(value, last) for _, value in self.readings]
+        return statistics.pstdev(offsets) > self.spread_threshold
+
+class AdaptiveScheduler:
+    """
+    Decides which metrics are due, reads them, and adapts their sampling intervals.
+    """
+
+    def __init__(self, floor_rate, ceiling_rate, backoff=DEFAULT_BACKOFF, window=DEFAULT_WINDOW):
+        """
+        :param floor_rate: The lowest sampling rate in readings per second.
+        :param ceiling_rate: The highest sampling rate in readings per second.
+        :param backoff: Factor the interval is multiplied by after every flat reading.
+        :param window: Number of recent readings used to judge variability.
+        """
+        if not 0 < floor_rate <= ceiling_rate:
+            raise ValueError("Rates must satisfy 0 < floor_rate <= ceiling_rate")
+        self.max_interval = 1 / floor_rate
+        self.min_interval = 1 / ceiling_rate
+        self.backoff = backoff
+        self.window = window
+        self.metrics = {}
+        self.rate_since = None
+
+    def add_metric(self, name, getter, change_threshold, spread_threshold, circular=False):
+        """
+        Registers a metric to be sampled, starting at the ceiling rate.
+        :param name: The name of the metric.
+        :param getter: A function returning the current reading.
+        :param change_threshold: Rate of change (units per second) that counts as "changing".
+        :param spread_threshold: Standard deviation of recent readings that counts as "changing".
+        :param circular: True for angles in degrees.
+        """
+        schedule = MetricSchedule(getter, change_threshold, spread_threshold, circular, self.window)
+        schedule.interval = self.min_interval
+        self.metrics[name] = schedule
+
+    def poll(self, now):
+        """
+        Reads every metric that is due and schedules its next reading.
+        :param now: The current time in seconds (time.monotonic()).
+        :return: A dictionary of metric name -> reading for the metrics that were read.
+        """
+        if self.rate_since is None:
+            self.rate_since = now
+        readings = {}
+        for name, schedule in self.metrics.items():
+            if now < schedule.next_due:
+                continue
+            value = schedule.getter()
+            schedule.readings.append((now, value))
+            schedule.count += 1
+            if schedule.is_active():
+                # Jump straight to the ceiling rate so fast changes are not missed.
+                schedule.interval = self.min_interval
+            else:
+                schedule.interval = min(schedule.interval * self.backoff, self.max_interval)
+            schedule.next_due = now + schedule.interval
+            readings[name] = value
+        return readings
+
+    def next_due(self):
+        """
+        :return: The time (time.monotonic()) at which the next metric is due.
+        """
+        return min(schedule.next_due for schedule in self.metrics.values())
+
+    def effective_rates(self, now):
+        """
+        Returns the number of readings per second of each metric since the previous call.
+        :param now: The current time in seconds (time.monotonic()).
+        :return: A dictionary of metric name -> readings per second.
+        """
+        elapsed = now - self.rate_since if self.rate_since is not None else 0
+        rates = {name: round(schedule.count / elapsed, 3) if elapsed > 0 else 0.0
+                 for name, schedule in self.metrics.items()}
+        for schedule in self.metrics.values():
+            schedule.count = 0
+        self.rate_since = now
+        return rates
@@ -0,0 +1,220 @@
+"""
+Compact encoding of batches of sensor readings for uplinks.
+
+A batch is a list of (nanoseconds, metric, value) readings, e.g. several sampling
+rounds of the Task2 publisher sent as one MQTT message. It is stored column by
+column: for each metric, the timestamps and the values (scaled to integers) are
+kept as differences from the previous reading, which turns slowly changing series
+into short, repetitive numbers. The columns are serialised as compact JSON and
+compressed with zlib, or with zstd when the optional zstandard package is installed.
+Both compressors are primed with a dictionary of typical batch content, so that
+the metric names and JSON structure cost almost nothing even in small batches.
+
+Payload layout:
+    byte 0    FORMAT_VERSION
+    byte 1    codec: 0 none, 1 zlib, 2 zstd
+    byte 2    dictionary id (0 for none)
+    bytes 3-  the compressed JSON body
+"""
+import functools
+import json
+import zlib
+
+FORMAT_VERSION = 1
+# Codec names and the ids stored in the payload header.
+CODECS = {'none': 0, 'zlib': 1, 'zstd': 2}
+# Values are stored as integers in units of 1/DEFAULT_SCALE; the publishers round readings to two decimals.
+DEFAULT_SCALE = 100
+# Compression levels: the defaults of both libraries, a good trade-off on a Raspberry Pi.
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# Size of a trained dictionary in bytes.
+DICTIONARY_SIZE = 1024
+# Largest decompressed body accepted, so a corrupt or hostile payload cannot exhaust memory.
+MAX_BODY_BYTES = 16 * 2 ** 20
+
+# Dictionaries by id. An id must never be reused for different content: the decoder
+# needs exactly the dictionary the encoder used. Generated with
+# `python3 benchmarks/payload_compression.py --print-dictionary`.
+DICTIONARIES = {
+    1: (
+        b'{"res":1,"scale":100,"metrics":{"temperature":{"t":[1792371198850833202,1002078005,10020'
+        b'46219],"v":[2121,3,-5]},"humidity":{"t":[1792371198850833202,1002078005,1002046219],"v":'
+        b'[4507,-1,7]},"pressure":{"t":[1792371198850833202,1002078005,1002046219],"v":[101305,-2,'
+        b'-1]},"magnetometer":{"t":[1792371198850833202,1002078005,1002046219],"v":[17951,-58,52]}'
+        b'}}{"res":1,"scale":100,"metrics":{"temperature":{"t":[1792371198850833202],"v":[2130]},"'
+        b'humidity":{"t":[1792371198850833202],"v":[4509]},"pressure":{"t":[1792371198850833202],"'
+        b'v":[101291]},"magnetometer":{"t":[1792371198850833202],"v":[17917]}}}{"res":1,"scale":10'
+        b'0,"metrics":{"temperature":{"t":[1792371198850833202],"v":[2122]},"humidity":{"t":[17923'
+        b'71198850833202],"v":[4501]},"pressure":{"t":[1792371198850833202],"v":[101297]},"magneto'
+        b'meter":{"t":[1792371198850833202],"v":[18021]}}}'
+    ),
+}
+DEFAULT_DICTIONARY = 1
+
+def _zstandard():
+    """
+    Imports the optional zstandard package on first use.
+    :return: The zstandard module, or None if it is not installed.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def available_codecs():
+    """
+    :return: The names of the codecs that can be used on this system.
+    """
+    return [name for name in CODECS if name != 'zstd' or _zstandard() is not None]
+
+def encode_columns(readings, scale=DEFAULT_SCALE, resolution_ns=1):
+    """
+    Serialises readings as delta-encoded columns, without compression.
+    :param readings: An iterable of (nanoseconds, metric, value) tuples.
+    :param scale: Values are stored as integers in units of 1/scale.
+    :param resolution_ns: Timestamps are stored in units of this many nanoseconds (1 keeps them exact).
+    :return: The JSON body as bytes.
+    """
+    columns = {}
+    for ns, metric, value in readings:
+        times, values, last = columns.setdefault(metric, ([], [], [0, 0]))
+        tick = ns // resolution_ns
+        scaled = round(value * scale)
+        times.append(tick - last[0])
+        values.append(scaled - last[1])
+        last[0], last[1] = tick, scaled
+    body = {'res': resolution_ns, 'scale': scale,
+            'metrics': {metric: {'t': times, 'v': values} for metric, (times, values, _) in columns.items()}}
+    return json.dumps(body, separators=(',', ':')).encode()
+
+def decode_columns(body):
+    """
+    Restores the readings from a body written by encode_columns().
+    :param body: The JSON body as bytes.
+    :return: A list of (nanoseconds, metric, value) tuples in time order.
+    :raises ValueError: If the body is not a valid batch.
+    """
+    try:
+        data = json.loads(body)
+        resolution_ns, scale = data['res'], data['scale']
+        # bool is a subclass of int, but true and false are not valid numbers here.
+        if type(resolution_ns) is not int or type(scale) is not int or resolution_ns <= 0 or scale <= 0:
+            raise ValueError("res and scale must be positive integers")
+        readings = []
+        for metric, column in data['metrics'].items():
+            times, values = column['t'], column['v']
+            if type(times) is not list or type(values) is not list or len(times) != len(values):
+                raise ValueError(f"the t and v columns of {metric!r} must be lists of the same length")
+            tick = scaled = 0
+            for delta_time, delta_value in zip(times, values):
+                if type(delta_time) is not int or type(delta_value) is not int:
+                    raise ValueError(f"the t and v columns of {metric!r} must hold integers")
+                tick += delta_time
+                scaled += delta_value
+                readings.append((tick * resolution_ns, metric, scaled / scale))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"invalid batch body: {e!r}") from None
+    # The sort is stable, so readings with the same timestamp keep the order of their metrics.
+    readings.sort(key=lambda reading: reading[0])
+    return readings
+
+def _zlib_compress(body, dictionary, level):
+    """
+    Compresses a body with zlib, using the smallest window that covers the dictionary and the body.
+    Setting up zlib's default 32 KB window and hash tables costs more than compressing a small
+    batch; the decompressor reads the window size from the zlib header.
+    """
+    wbits = min(max((len(dictionary) + len(body) - 1).bit_length(), 10), 15)
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, wbits, wbits - 7, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, wbits, wbits - 7)
+    return compressor.compress(body) + compressor.flush()
+
+@functools.lru_cache(maxsize=None)
+def _zstd_dictionary(dictionary_id):
+    zstandard = _zstandard()
+    return zstandard.ZstdCompressionDict(DICTIONARIES[dictionary_id], dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+@functools.lru_cache(maxsize=None)
+def _zstd_compressor(dictionary_id, level):
+    zstandard = _zstandard()
+    if dictionary_id:
+        return zstandard.ZstdCompressor(level=level, dict_data=_zstd_dictionary(dictionary_id))
+    return zstandard.ZstdCompressor(level=level)
+
+@functools.lru_cache(maxsize=None)
+def _zstd_decompressor(dictionary_id):
+    zstandard = _zstandard()
+    if dictionary_id:
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dictionary(dictionary_id))
+    return zstandard.ZstdDecompressor()
+
+def encode_batch(readings, codec='zlib', dictionary_id=DEFAULT_DICTIONARY, scale=DEFAULT_SCALE, resolution_ns=1):
+    """
+    Encodes a batch of readings as one compact payload.
+    The zstd compressors are cached, so this must not be called from several threads at once.
+    :param readings: An iterable of (nanoseconds, metric, value) tuples.
+    :param codec: "zlib", "zstd" or "none".
+    :param dictionary_id: The id of the dictionary in DICTIONARIES to prime the compressor with, or 0 for none.
+    :param scale: Values are stored as integers in units of 1/scale.
+    :param resolution_ns: Timestamps are stored in units of this many nanoseconds (1 keeps them exact).
+    :return: The payload as bytes.
+    :raises ValueError: If the codec is unknown or not installed.
+    """
+    if codec not in available_codecs():
+        raise ValueError(f"codec {codec!r} is not available; use one of {', '.join(available_codecs())}")
+    body = encode_columns(readings, scale, resolution_ns)
+    if codec == 'none':
+        dictionary_id = 0
+    elif codec == 'zlib':
+        body = _zlib_compress(body, DICTIONARIES[dictionary_id] if dictionary_id else b'', ZLIB_LEVEL)
+    else:
+        body = _zstd_compressor(dictionary_id, ZSTD_LEVEL).compress(body)
+    return bytes((FORMAT_VERSION, CODECS[codec], dictionary_id)) + body
+
+def decode_batch(payload):
+    """
+    Decodes a payload written by encode_batch().
+    :param payload: The payload as bytes.
+    :return: A list of (nanoseconds, metric, value) tuples in time order.
+    :raises ValueError: If the payload is invalid, or needs a codec or dictionary that is not available.
+    """
+    if len(payload) < 3 or payload[0] != FORMAT_VERSION:
+        raise ValueError("not a batch payload")
+    codec, dictionary_id, body = payload[1], payload[2], payload[3:]
+    if dictionary_id and dictionary_id not in DICTIONARIES:
+        raise ValueError(f"unknown dictionary {dictionary_id}")
+    if codec == CODECS['zlib']:
+        decompressor = zlib.decompressobj(zdict=DICTIONARIES[dictionary_id]) if dictionary_id else zlib.decompressobj()
+        try:
+            body = decompressor.decompress(body, MAX_BODY_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"invalid zlib data: {e}") from None
+        if decompressor.unconsumed_tail:
+            raise ValueError("batch body too large")
+    elif codec == CODECS['zstd']:
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise ValueError("zstd batch received, but the zstandard package is not installed")
+        try:
+            body = _zstd_decompressor(dictionary_id).decompress(body, max_output_size=MAX_BODY_BYTES)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"invalid zstd data: {e}") from None
+    elif codec != CODECS['none']:
+        raise ValueError(f"unknown codec {codec}")
+    return decode_columns(body)
+
+def train_dictionary(bodies, size=DICTIONARY_SIZE):
+    """
+    Builds a dictionary from the bodies of representative batches.
+    zlib and raw-content zstd dictionaries are data the compressor can refer back to as if it
+    preceded the payload, so the bodies themselves make a good dictionary. Content near the end
+    is the cheapest to refer to, so the most typical bodies should come last.
+    :param bodies: Bodies written by encode_columns(), least typical first.
+    :param size: The maximum size of the dictionary in bytes.
+    :return: The dictionary as bytes.
+    """
+    return b''.join(bodies)[-size:]
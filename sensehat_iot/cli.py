@@ -0,0 +1,264 @@
+import argparse
+import importlib.util
+import os
+import sys
+import threading
+
+from sensehat_iot.defaults import DEFAULT_INTERVAL, DEFAULT_SOCKET_PATH
+
+# Only the standard library is imported here. Each mode's heavy dependencies
+# (sense_hat, paho, matplotlib, Adafruit_IO, dotenv) are imported by the mode
+# itself, so e.g. the headless modes never load matplotlib.
+
+# Root directory of the project, which contains the TaskN folders.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Modes ---
+# Map each subcommand to the script that implements it and a short description.
+MODES = {
+    'display': ('Task1/sensehat_sensor_display.py', 'Show the sensor readings on the terminal and the LED matrix'),
+    'publish': ('Task2/mqtt_publisher.py', 'Publish the sensor readings to the MQTT broker'),
+    'plot': ('Task2/mqtt_publisher_plotter.py', 'Plot the sensor readings live with matplotlib'),
+    'log': ('Task3/joystick_mqtt_logger.py', 'Subscribe to the joystick-selected topic and log it to CSV'),
+    'cloud-publish': ('Task4.1/adafruit_io_publisher.py', 'Publish the sensor readings to Adafruit IO'),
+    'cloud-display': ('Task4.2/adafruit_io_subscriber_display.py', 'Display the Adafruit IO feeds on the LED matrix'),
+}
+# Modes that need the main thread (matplotlib's GUI event loop).
+MAIN_THREAD_MODES = {'plot'}
+
+def load_mode(mode):
+    """
+    Loads the script that implements a mode as a module, without running it.
+    :param mode: The name of the mode (a key of MODES).
+    :return: The loaded module.
+    """
+    path = os.path.join(PROJECT_ROOT, MODES[mode][0])
+    name = 'sensehat_iot.modes.' + mode.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def open_sense_hat():
+    """
+    Opens the Sense HAT hardware.
+    :return: A SenseHat instance.
+    """
+    from sense_hat import SenseHat
+    return SenseHat()
+
+def run_sampler(args):
+    """
+    Runs the sampler: one thread owns the Sense HAT sensors, the requested modes run in
+    this process on the shared snapshot, and other processes can attach through the Unix socket.
+    :param args: The parsed command line arguments.
+    :return: The process exit code.
+    """
+    from sensehat_iot.sampler import Sampler, Snapshot, SnapshotSense, SnapshotServer
+
+    hardware = open_sense_hat()
+    snapshot = Snapshot()
+    sampler = Sampler(hardware, snapshot, args.interval)
+    sampler.start()
+    server = None
+    if not args.no_socket:
+        server = SnapshotServer(snapshot, args.socket)
+        server.start()
+        print(f"Sampler publishing on {args.socket} every {args.interval} s")
+
+    # Every in-process consumer shares the sensor snapshot and the LED/joystick hardware.
+    modes = list(dict.fromkeys(args.run))
+    main_thread_modes = [mode for mode in modes if mode in MAIN_THREAD_MODES]
+    if len(main_thread_modes) > 1:
+        print(f"Only one of {', '.join(sorted(MAIN_THREAD_MODES))} can run in the sampler")
+        return 2
+    for mode in modes:
+        if mode not in MAIN_THREAD_MODES:
+            module = load_mode(mode)
+            threading.Thread(target=module.main, args=(SnapshotSense(snapshot, lambda: hardware),),
+                             name=mode, daemon=True).start()
+
+    try:
+        if main_thread_modes:
+            load_mode(main_thread_modes[0]).main(SnapshotSense(snapshot, lambda: hardware))
+        else:
+            # Keep the process alive while the consumers and the socket server run.
+            sampler.join()
+    except KeyboardInterrupt:
+        print("Exiting program.")
+    finally:
+        sampler.stop()
+        if server is not None:
+            server.close()
+    return 0
+
+def run_replay(args):
+    """
+    Replays the logger's CSV files to the MQTT broker.
+    :param args: The parsed command line arguments.
+    :return: The process exit code.
+    """
+    from sensehat_iot import replay
+
+    logger = load_mode('log')
+    return replay.run(args.csv_dir or logger.csv_directory, logger.csv_files, args.broker, args.port,
+                      args.speed, args.qos, args.restamp)
+
+def run_serve(args):
+    """
+    Serves the logger's CSV files over the local HTTP query API.
+    :param args: The parsed command line arguments.
+    :return: The process exit code.
+    """
+    from sensehat_iot import query
+
+    logger = load_mode('log')
+    query.run(args.csv_dir or logger.csv_directory, logger.csv_files, args.host, args.port,
+              args.hot_hours * 3600, args.cache_blocks)
+    return 0
+
+def run_soak(args):
+    """
+    Soak-tests one mode against fake sensors under a virtual clock.
+    :param args: The parsed command line arguments.
+    :return: The process exit code: 0 if every budget was respected, 1 otherwise.
+    """
+    import shutil
+    import tempfile
+    from sensehat_iot import soak
+
+    budgets = {'rss_mb': args.rss_budget, 'fds': args.fd_budget, 'threads': args.thread_budget,
+               'latency_ratio': args.latency_budget}
+    workdir = tempfile.mkdtemp(prefix='sensehat-soak-')
+    try:
+        passed = soak.run(load_mode(args.soak_mode), args.soak_mode, args.days * 86400, args.sample_hours * 3600,
+                          args.warmup_hours * 3600, budgets, args.broker, args.real_fraction, args.report,
+                          args.show_output, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if passed else 1
+
+def parse_speed(text):
+    """
+    Parses a replay speed such as "1", "10x" or "max".
+    :param text: The speed given on the command line.
+    :return: The speed relative to real time, or 0 for "max".
+    """
+    if text.lower() == 'max':
+        return 0.0
+    speed = float(text.lower().rstrip('x'))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+def build_parser():
+    """
+    Builds the command line parser with one subcommand per mode.
+    :return: An argparse.ArgumentParser.
+    """
+    parser = argparse.ArgumentParser(prog='python3 -m sensehat_iot', description='Raspberry Pi 5 Sense HAT IoT system.')
+    subparsers = parser.add_subparsers(dest='mode', required=True, metavar='mode')
+    for mode, (_, help_text) in MODES.items():
+        subparser = subparsers.add_parser(mode, help=help_text, description=help_text)
+        subparser.add_argument('--import-only', action='store_true',
+                               help="import the mode's dependencies and exit (used by the startup benchmark)")
+        subparser.add_argument('--sampler', metavar='SOCKET', nargs='?', const=DEFAULT_SOCKET_PATH,
+                               help='read the sensors from a running sampler instead of the hardware '
+                                    f'(default socket: {DEFAULT_SOCKET_PATH})')
+        if mode == 'publish':
+            subparser.add_argument('--adaptive', action='store_true',
+                                   help='sample each sensor faster while it changes and slower while it is steady')
+            subparser.add_argument('--batch', type=int, metavar='ROUNDS',
+                                   help='publish the readings of ROUNDS sampling rounds as one compressed message')
+            subparser.add_argument('--batch-codec', choices=('zlib', 'zstd', 'none'),
+                                   help='compression of the batches (default: zlib; zstd needs the zstandard package)')
+
+    sampler_help = 'Own the Sense HAT sensors and share the latest readings with other modes'
+    subparser = subparsers.add_parser('sampler', help=sampler_help, description=sampler_help)
+    subparser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                           help=f'seconds between two sensor reads (default: {DEFAULT_INTERVAL})')
+    subparser.add_argument('--socket', default=DEFAULT_SOCKET_PATH,
+                           help=f'Unix socket other processes attach to (default: {DEFAULT_SOCKET_PATH})')
+    subparser.add_argument('--no-socket', action='store_true', help='only serve the modes given with --run')
+    subparser.add_argument('--run', nargs='+', default=[], choices=list(MODES), metavar='MODE',
+                           help='modes to run in this process on the shared readings')
+
+    replay_help = "Re-publish the logger's CSV files to their original topics"
+    subparser = subparsers.add_parser('replay', help=replay_help, description=replay_help)
+    subparser.add_argument('--csv-dir', help="directory of the logger's CSV files (default: the logger's csv_directory)")
+    subparser.add_argument('--broker', default='127.0.0.1', help='MQTT broker address (default: 127.0.0.1)')
+    subparser.add_argument('--port', type=int, default=1883, help='MQTT broker port (default: 1883)')
+    subparser.add_argument('--speed', type=parse_speed, default=1.0,
+                           help="replay speed: 1 for real time, e.g. 10x for ten times faster, or max (default: 1)")
+    subparser.add_argument('--qos', type=int, choices=(0, 1, 2), default=0, help='QoS level (default: 0)')
+    subparser.add_argument('--restamp', action='store_true',
+                           help='send the time of publishing instead of the logged time, e.g. for load tests')
+
+    serve_help = "Serve the logger's CSV files over a local HTTP query API"
+    subparser = subparsers.add_parser('serve', help=serve_help, description=serve_help)
+    subparser.add_argument('--csv-dir', help="directory of the logger's CSV files (default: the logger's csv_directory)")
+    subparser.add_argument('--host', default='127.0.0.1',
+                           help='address to listen on; 0.0.0.0 for every interface (default: 127.0.0.1)')
+    subparser.add_argument('--port', type=int, default=8080, help='port to listen on (default: 8080)')
+    subparser.add_argument('--hot-hours', type=float, default=6,
+                           help='hours of recent data kept in the memory cache (default: 6)')
+    subparser.add_argument('--cache-blocks', type=int,
+                           help='maximum number of cached 5-minute blocks over all sensors '
+                                '(default: enough for the hot window of every sensor)')
+
+    soak_help = 'Run a mode against fake sensors under an accelerated clock and check for resource growth'
+    subparser = subparsers.add_parser('soak', help=soak_help, description=soak_help)
+    subparser.add_argument('soak_mode', choices=list(MODES), metavar='MODE', help='the mode to soak-test')
+    subparser.add_argument('--days', type=float, default=3, help='simulated days to run (default: 3)')
+    subparser.add_argument('--sample-hours', type=float, default=1, help='simulated hours between samples (default: 1)')
+    subparser.add_argument('--warmup-hours', type=float, default=1,
+                           help='simulated hours before the baseline sample (default: 1)')
+    subparser.add_argument('--broker', default='127.0.0.1', help='local MQTT broker address (default: 127.0.0.1)')
+    subparser.add_argument('--real-fraction', type=float, default=0.0,
+                           help='fraction of every sleep that is really slept, e.g. 0.001 (default: 0)')
+    subparser.add_argument('--rss-budget', type=float, default=5.0, help='allowed RSS growth in MB (default: 5)')
+    subparser.add_argument('--fd-budget', type=int, default=2, help='allowed growth of open file descriptors (default: 2)')
+    subparser.add_argument('--thread-budget', type=int, default=2, help='allowed growth of the thread count (default: 2)')
+    subparser.add_argument('--latency-budget', type=float, default=2.0,
+                           help='allowed ratio between the final and baseline p95 cycle latency (default: 2)')
+    subparser.add_argument('--report', help='write every sample to this JSON file')
+    subparser.add_argument('--show-output', action='store_true', help="show the mode's own console output")
+    return parser
+
+def main(argv=None):
+    """
+    Parses the command line and runs the selected mode.
+    :param argv: The command line arguments (defaults to sys.argv[1:]).
+    :return: The process exit code.
+    """
+    args = build_parser().parse_args(argv)
+    if args.mode == 'sampler':
+        return run_sampler(args)
+    if args.mode == 'replay':
+        return run_replay(args)
+    if args.mode == 'serve':
+        return run_serve(args)
+    if args.mode == 'soak':
+        return run_soak(args)
+
+    module = load_mode(args.mode)
+    if args.import_only:
+        module.load_dependencies()
+        return 0
+
+    if getattr(args, 'adaptive', False):
+        module.ADAPTIVE_SAMPLING = True
+    if getattr(args, 'batch', None):
+        module.BATCH_SIZE = args.batch
+    if getattr(args, 'batch_codec', None):
+        module.BATCH_CODEC = args.batch_codec
+
+    hat = None
+    if args.sampler:
+        from sensehat_iot.sampler import SnapshotSense, SnapshotSubscriber
+        subscriber = SnapshotSubscriber(args.sampler)
+        subscriber.start()
+        hat = SnapshotSense(subscriber.snapshot, open_sense_hat)
+    module.main(hat)
+    return 0
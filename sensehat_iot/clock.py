@@ -0,0 +1,128 @@
+"""
+Nanosecond timestamps for sensor readings.
+
+Readings are stamped with integer nanoseconds since the Unix epoch when the sensors
+are read, carried in the MQTT payloads and stored as integers. They are only turned
+into text for display, with format_ns().
+
+The wall clock is read once as an anchor, and later timestamps add the time elapsed
+on the monotonic clock since then, so small wall clock corrections do not make them
+jump or go backwards. When the wall clock moves away from the anchored time by more
+than STEP_TOLERANCE_NS (e.g. the first NTP sync after a Raspberry Pi without a
+real-time clock boots), the clock is anchored again.
+"""
+import functools
+import json
+import time
+
+NS_PER_SECOND = 1_000_000_000
+# Difference between the wall clock and the anchored time after which the clock is anchored again.
+STEP_TOLERANCE_NS = NS_PER_SECOND // 2
+# Key of the timestamp in a JSON reading payload.
+TIMESTAMP_KEY = 'ts'
+
+class AnchoredClock:
+    """
+    Wall clock time in nanoseconds that advances with the monotonic clock.
+    """
+
+    def __init__(self):
+        self.anchor()
+
+    def anchor(self):
+        """
+        Reads the wall clock and the monotonic clock together as the new anchor.
+        """
+        self.offset = time.time_ns() - time.monotonic_ns()
+
+    def now_ns(self):
+        """
+        :return: The current time in nanoseconds since the Unix epoch.
+        """
+        now = self.offset + time.monotonic_ns()
+        if abs(time.time_ns() - now) > STEP_TOLERANCE_NS:
+            self.anchor()
+            now = self.offset + time.monotonic_ns()
+        return now
+
+# The clock shared by everything in this process.
+_clock = AnchoredClock()
+
+def now_ns():
+    """
+    :return: The current time in nanoseconds since the Unix epoch, from the process's anchored clock.
+    """
+    return _clock.now_ns()
+
+def read_ns(sense):
+    """
+    Returns the time the sensor values of a Sense HAT are read at.
+    :param sense: A SenseHat, or a sampler's SnapshotSense that serves values read earlier.
+    :return: The read time of the snapshot's latest sample, or the current time for a SenseHat,
+             in nanoseconds since the Unix epoch.
+    """
+    return sense.read_ns() if hasattr(sense, 'read_ns') else now_ns()
+
+@functools.lru_cache(maxsize=1024)
+def _minute_prefix(minute, utc):
+    seconds = minute * 60
+    return time.strftime('%Y-%m-%d %H:%M:', time.gmtime(seconds) if utc else time.localtime(seconds))
+
+def format_ns(ns, digits=0, utc=False):
+    """
+    Formats a timestamp for display as "YYYY-MM-DD HH:MM:SS", in local time.
+    Time zones differ from UTC by whole minutes, so the formatted minute is cached and only the seconds are added.
+    :param ns: Nanoseconds since the Unix epoch.
+    :param digits: Number of decimal places of the seconds (0 to 9).
+    :param utc: True to format in UTC instead of local time.
+    :return: The formatted time, e.g. "2024-05-01 10:00:00.123" with digits=3.
+    """
+    seconds, fraction = divmod(ns, NS_PER_SECOND)
+    text = f'{_minute_prefix(seconds // 60, utc)}{seconds % 60:02d}'
+    if digits:
+        text += f'.{fraction:09d}'[:digits + 1]
+    return text
+
+def iso_utc(ns, digits=3):
+    """
+    Formats a timestamp as an ISO 8601 UTC string, for APIs such as Adafruit IO.
+    :param ns: Nanoseconds since the Unix epoch.
+    :param digits: Number of decimal places of the seconds (0 to 9).
+    :return: The formatted time, e.g. "2024-05-01T10:00:00.123Z".
+    """
+    return format_ns(ns, digits, utc=True).replace(' ', 'T') + 'Z'
+
+def encode_reading(key, value, ns):
+    """
+    Builds the MQTT payload of one sensor reading.
+    :param key: The name of the reading, e.g. "temperature".
+    :param value: The sensor value.
+    :param ns: The time the sensor was read, in nanoseconds since the Unix epoch.
+    :return: A JSON payload such as '{"temperature": 21.5, "ts": 1714557600123456789}'.
+    """
+    return json.dumps({key: value, TIMESTAMP_KEY: ns})
+
+def decode_reading(payload):
+    """
+    Parses the MQTT payload of one sensor reading.
+    Both the JSON payloads built by encode_reading() and plain numbers (as sent by older publishers) are accepted.
+    :param payload: The payload as bytes or text.
+    :return: A (value, nanoseconds) tuple; the nanoseconds are None if the payload carries no timestamp.
+    :raises ValueError: If the payload is not a reading.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    try:
+        return float(payload), None
+    except ValueError:
+        pass
+    data = json.loads(payload)
+    if not isinstance(data, dict):
+        raise ValueError(f"not a reading: {payload!r}")
+    ns = data.pop(TIMESTAMP_KEY, None)
+    if len(data) != 1:
+        raise ValueError(f"expected one value in {payload!r}")
+    try:
+        return float(next(iter(data.values()))), int(ns) if ns is not None else None
+    except TypeError:
+        raise ValueError(f"not a reading: {payload!r}") from None
@@ -0,0 +1,11 @@
+"""
+Default settings shared by the command line and the modules that implement it.
+
+This module imports nothing, so the command line can show its defaults without
+loading the sampler (socket, threading, json) for every mode.
+"""
+
+# Default path of the Unix socket the sampler publishes its samples on.
+DEFAULT_SOCKET_PATH = '/tmp/sensehat-sampler.sock'
+# Default number of seconds between two hardware reads of the sampler.
+DEFAULT_INTERVAL = 1.0
@@ -0,0 +1,469 @@
+"""
+Local HTTP query API over the CSV files written by the Task3 logger.
+
+A small read-only server answers requests for the latest value, a time range or
+aggregates of one sensor, straight from the logger's files:
+
+    GET /sensors                                   the sensors and their files
+    GET /sensors/<sensor>/latest                   the last logged reading
+    GET /sensors/<sensor>/range?start=&end=        every reading in [start, end)
+    GET /sensors/<sensor>/aggregate?start=&end=&bucket=
+                                                   count/min/max/mean, optionally per bucket of seconds
+
+start and end are Unix times in seconds or nanoseconds, negative offsets in seconds
+from now (e.g. -3600), or "YYYY-MM-DD HH:MM:SS" local times. The range defaults to
+the last hour. Ranges and aggregates are streamed as NDJSON, or as CSV with
+format=csv. Every row carries its timestamp as integer nanoseconds ("ns") and,
+formatted for display, as local time ("time").
+
+The files are append-only and in time order. Recent rows are cached in memory in
+fixed-size time blocks with LRU eviction; the newest block is extended from the
+last offset read as the file grows, so polling a recent window reads only the
+new bytes. Older ranges are read from disk, starting at an offset found by a
+binary search over the file.
+"""
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from sensehat_iot.clock import NS_PER_SECOND, format_ns
+from sensehat_iot.replay import parse_row
+
+# Seconds of logged data covered by one cached block.
+BLOCK_SECONDS = 300
+BLOCK_NS = BLOCK_SECONDS * NS_PER_SECOND
+# Seconds before now within which blocks are cached; older ranges are read from disk.
+DEFAULT_HOT_SECONDS = 6 * 3600
+# Range used when a query gives no start, in seconds before the end.
+DEFAULT_RANGE = 3600
+# Bytes left for a linear scan once the binary search has narrowed the range.
+SCAN_BYTES = 4096
+# Bytes read from the end of a file to find its last row.
+TAIL_BYTES = 4096
+# Bytes collected before a chunk of a streamed response is sent.
+CHUNK_BYTES = 16384
+
+def sensor_name(title):
+    """
+    Derives the URL name of a sensor from its CSV file name.
+    :param title: The file name, e.g. "Barometric pressure.csv".
+    :return: The sensor name, e.g. "barometric-pressure".
+    """
+    return os.path.splitext(title)[0].lower().replace(' ', '-')
+
+def parse_time(text, now):
+    """
+    Parses a start or end query parameter.
+    :param text: A Unix time in seconds or nanoseconds, a negative offset in seconds from now,
+                 or a local date and time.
+    :param now: The current time in nanoseconds since the Unix epoch.
+    :return: The time in nanoseconds since the Unix epoch.
+    :raises ValueError: If the text is not a valid time, or is too large to be one.
+    """
+    if text.isdigit() and len(text) >= 16:
+        # Too large for seconds: already nanoseconds, parsed exactly.
+        return int(text)
+    try:
+        seconds = float(text)
+    except ValueError:
+        return int(datetime.fromisoformat(text).timestamp() * NS_PER_SECOND)
+    if not math.isfinite(seconds * NS_PER_SECOND):
+        raise ValueError(f"invalid time '{text}'")
+    return now + int(seconds * NS_PER_SECOND) if seconds < 0 else int(seconds * NS_PER_SECOND)
+
+def blocks_for(hot_seconds, files):
+    """
+    Returns the number of blocks that holds the hot window of every file.
+    The window rarely starts on a block boundary, so it spans one block more than its length.
+    :param hot_seconds: Seconds before now within which blocks are cached.
+    :param files: The number of files.
+    :return: The number of blocks.
+    """
+    return (math.ceil(hot_seconds / BLOCK_SECONDS) + 1) * files
+
+def read_line_rows(file, start, end):
+    """
+    Reads rows from a binary file at its current position.
+    Only complete lines are consumed, so a row still being written is left for the next read.
+    :param file: A file opened in binary mode.
+    :param start: Rows before this time (in nanoseconds) are skipped.
+    :param end: Reading stops at the first row at or after this time (None for no limit).
+    :return: A generator of (nanoseconds, value string) tuples; file.tell() is after the last row consumed.
+    """
+    while True:
+        position = file.tell()
+        line = file.readline()
+        if not line.endswith(b'\n'):
+            file.seek(position)
+            return
+        row = parse_row(line.decode('utf-8', 'replace'))
+        if row is None or row[0] < start:
+            continue
+        if end is not None and row[0] >= end:
+            file.seek(position)
+            return
+        yield row
+
+def seek_time(file, target):
+    """
+    Positions a binary file at the first row at or after a time.
+    The rows must be in time order, as the logger appends them.
+    :param file: A file opened in binary mode.
+    :param target: The time to look for, in nanoseconds since the Unix epoch.
+    """
+    file.seek(0, os.SEEK_END)
+    low, high = 0, file.tell()
+    # Every row from the first one at or after target starts after low.
+    while high - low > SCAN_BYTES:
+        middle = (low + high) // 2
+        file.seek(middle)
+        file.readline()
+        row = parse_row(file.readline().decode('utf-8', 'replace'))
+        if row is not None and row[0] < target:
+            low = middle
+        else:
+            high = middle
+    file.seek(low)
+    if low:
+        # Skip the partial line; the row at low itself is before the target.
+        file.readline()
+    for _ in read_line_rows(file, target, target):
+        pass
+
+class Block:
+    """
+    The rows of one file within one BLOCK_SECONDS window, with their times in nanoseconds.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.rows = []
+        # Serialises the reads of this block, so other blocks are served while its file is read.
+        self.lock = threading.Lock()
+        # File offset after the last row read, where the next refresh continues.
+        self.offset = None
+        # True once a row after the window was seen, so no more rows can be added.
+        self.complete = False
+
+class HotWindowCache:
+    """
+    LRU cache of recent rows, in BLOCK_SECONDS blocks per file.
+    """
+
+    def __init__(self, max_blocks, hot_seconds=DEFAULT_HOT_SECONDS):
+        """
+        :param max_blocks: Maximum number of cached blocks over all files (see blocks_for()).
+        :param hot_seconds: Seconds before now within which blocks are cached.
+        """
+        self.max_blocks = max_blocks
+        self.hot_ns = int(hot_seconds * NS_PER_SECOND)
+        self.blocks = OrderedDict()  # (path, block start) -> Block
+        self.latest = {}  # path -> (file size, last row)
+        # Guards the block index and the latest rows; files are read without holding it.
+        self.lock = threading.Lock()
+
+    def _fill(self, path, block):
+        """
+        Reads the rows of a block that are not cached yet from its file.
+        """
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if block.offset is not None and size < block.offset:
+            # The file was truncated or replaced: start the block again.
+            block.rows, block.offset = [], None
+        if block.offset == size:
+            return
+        end = block.start + BLOCK_NS
+        with open(path, 'rb') as file:
+            if block.offset is None:
+                seek_time(file, block.start)
+            else:
+                file.seek(block.offset)
+            block.rows.extend(read_line_rows(file, block.start, end))
+            block.offset = file.tell()
+            # A row left unread at or after the end of the window means it is complete.
+            block.complete = block.offset < size and file.readline().endswith(b'\n')
+
+    def block_rows(self, path, start):
+        """
+        Returns the rows of one block, reading only what is not cached yet.
+        :param path: The path of the CSV file.
+        :param start: The start of the block in nanoseconds, a multiple of BLOCK_NS.
+        :return: A list of (nanoseconds, value string) tuples.
+        """
+        key = (path, start)
+        with self.lock:
+            block = self.blocks.get(key)
+            if block is None:
+                block = self.blocks[key] = Block(start)
+            else:
+                self.blocks.move_to_end(key)
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+        # An evicted block is still complete for this caller; it is only dropped from the index.
+        with block.lock:
+            if not block.complete:
+                self._fill(path, block)
+            # The caller iterates a copy, so a refresh cannot change it underneath.
+            return list(block.rows)
+
+    def rows(self, path, start, end, now=None):
+        """
+        Yields the rows of a file in [start, end), from the cache for the hot window and from disk before it.
+        Rows are only returned up to the end of the current block: blocks after now are never
+        cached, so an end far in the future cannot fill the cache with empty blocks.
+        :param path: The path of the CSV file.
+        :param start: The time of the first row, in nanoseconds since the Unix epoch.
+        :param end: The time after the last row.
+        :param now: The current time in nanoseconds (defaults to time.time_ns()).
+        :return: A generator of (nanoseconds, value string) tuples in time order.
+        """
+        now = time.time_ns() if now is None else now
+        hot_start = (now - self.hot_ns) // BLOCK_NS * BLOCK_NS
+        if start < hot_start:
+            cold_end = min(end, hot_start)
+            try:
+                with open(path, 'rb') as file:
+                    seek_time(file, start)
+                    yield from read_line_rows(file, start, cold_end)
+            except FileNotFoundError:
+                return
+            start = cold_end
+        hot_end = min(end, now // BLOCK_NS * BLOCK_NS + BLOCK_NS)
+        block_start = start // BLOCK_NS * BLOCK_NS
+        while block_start < hot_end:
+            for row in self.block_rows(path, block_start):
+                if start <= row[0] < end:
+                    yield row
+            block_start += BLOCK_NS
+
+    def last_row(self, path):
+        """
+        Returns the last row of a file, reading its tail only when the file has grown.
+        :param path: The path of the CSV file.
+        :return: A (nanoseconds, value string) tuple, or None if the file has no rows.
+        """
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            cached = self.latest.get(path)
+            if cached is not None and cached[0] == size:
+                return cached[1]
+        with open(path, 'rb') as file:
+            file.seek(max(0, size - TAIL_BYTES))
+            lines = file.read(size - file.tell()).splitlines()
+        row = None
+        for line in reversed(lines):
+            row = parse_row(line.decode('utf-8', 'replace'))
+            if row is not None:
+                break
+        with self.lock:
+            self.latest[path] = (size, row)
+        return row
+
+def numeric(rows):
+    """
+    Converts the values of rows to floats, skipping rows whose value is not a number.
+    :param rows: An iterable of (nanoseconds, value string) tuples.
+    :return: A generator of (nanoseconds, float) tuples.
+    """
+    for row_time, value in rows:
+        try:
+            yield row_time, float(value)
+        except ValueError:
+            continue
+
+def aggregate(rows, bucket=None):
+    """
+    Computes the count, minimum, maximum and mean of rows, over the whole range or per bucket.
+    :param rows: An iterable of (nanoseconds, float) tuples in time order.
+    :param bucket: The bucket length in nanoseconds, or None for one aggregate over all rows.
+    :return: A generator of (bucket start in nanoseconds, count, min, max, mean) tuples.
+    """
+    count = 0
+    start = low = high = None
+    total = 0.0
+    for row_time, value in rows:
+        if bucket:
+            key = row_time // bucket * bucket
+            if count and key != start:
+                yield start, count, low, high, total / count
+                count = 0
+        else:
+            key = row_time
+        if not count:
+            start, total, low, high = key, 0.0, value, value
+        count += 1
+        total += value
+        low = min(low, value)
+        high = max(high, value)
+    if count:
+        yield start, count, low, high, total / count
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Serves the query API. The server object carries the sensors and the cache.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if parts == ['sensors']:
+                self.send_json([{'sensor': name, 'topic': topic, 'file': title}
+                                for name, (topic, title) in self.server.sensors.items()])
+            elif len(parts) == 3 and parts[0] == 'sensors':
+                if parts[1] not in self.server.sensors:
+                    self.send_json({'error': f"unknown sensor '{parts[1]}'"}, 404)
+                    return
+                handler = {'latest': self.latest, 'range': self.range, 'aggregate': self.aggregate}.get(parts[2])
+                if handler is None:
+                    self.send_json({'error': f"unknown query '{parts[2]}'"}, 404)
+                    return
+                handler(self.server.path(parts[1]), params)
+            else:
+                self.send_json({'error': 'not found'}, 404)
+        except (ValueError, OverflowError) as e:
+            # OverflowError: a number too large to convert to nanoseconds.
+            self.send_json({'error': str(e)}, 400)
+        except ConnectionError:
+            # The client went away in the middle of a streamed response.
+            self.close_connection = True
+
+    def latest(self, path, params):
+        row = self.server.cache.last_row(path)
+        if row is None:
+            self.send_json({'error': 'no data'}, 404)
+            return
+        self.send_json({'time': format_ns(row[0], 3), 'ns': row[0], 'value': float(row[1])})
+
+    def time_range(self, params):
+        now = time.time_ns()
+        end = parse_time(params['end'], now) if 'end' in params else now + 1
+        start = parse_time(params['start'], now) if 'start' in params else end - DEFAULT_RANGE * NS_PER_SECOND
+        return start, end
+
+    def range(self, path, params):
+        start, end = self.time_range(params)
+        rows = self.server.cache.rows(path, start, end)
+        self.send_rows(params, ('time', 'ns', 'value'),
+                       ((format_ns(row_ns, 3), row_ns, value) for row_ns, value in numeric(rows)))
+
+    def aggregate(self, path, params):
+        start, end = self.time_range(params)
+        bucket = None
+        if 'bucket' in params:
+            seconds = float(params['bucket'])
+            if not math.isfinite(seconds * NS_PER_SECOND):
+                raise ValueError("bucket must be a finite number of seconds")
+            bucket = int(seconds * NS_PER_SECOND)
+            if bucket <= 0:
+                raise ValueError("bucket must be positive")
+        rows = aggregate(numeric(self.server.cache.rows(path, start, end)), bucket)
+        self.send_rows(params, ('time', 'ns', 'count', 'min', 'max', 'mean'),
+                       ((format_ns(bucket_start, 3), bucket_start, count, low, high, round(mean, 4))
+                        for bucket_start, count, low, high, mean in rows))
+
+    def send_json(self, body, status=200):
+        payload = (json.dumps(body) + '\n').encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_rows(self, params, columns, rows):
+        """
+        Streams rows as NDJSON or CSV with chunked transfer encoding, without building the whole response.
+        """
+        output = params.get('format', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            raise ValueError("format must be ndjson or csv")
+        # Read the first row before sending the headers, so a bad query still gets a 400.
+        rows = iter(rows)
+        first = next(rows, None)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson' if output == 'ndjson' else 'text/csv')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        if output == 'ndjson':
+            # A fixed line template is several times faster than json.dumps() per row.
+            template = '{{' + ', '.join(f'"{column}": "{{}}"' if column == 'time' else f'"{column}": {{}}'
+                                        for column in columns) + '}}\n'
+            chunk = []
+        else:
+            template = ','.join('{}' for _ in columns) + '\n'
+            chunk = [','.join(columns) + '\n']
+        size = 0
+        for row in itertools.chain([first] if first is not None else [], rows):
+            line = template.format(*row)
+            chunk.append(line)
+            size += len(line)
+            if size >= CHUNK_BYTES:
+                self.write_chunk(''.join(chunk))
+                chunk, size = [], 0
+        if chunk:
+            self.write_chunk(''.join(chunk))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+    def log_message(self, format, *args):
+        pass
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    HTTP server over the logger's CSV files, sharing one cache between its request threads.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, csv_directory, csv_files, cache):
+        """
+        :param address: The (host, port) to listen on.
+        :param csv_directory: The directory containing the CSV files.
+        :param csv_files: A dictionary mapping each MQTT topic to its CSV file name.
+        :param cache: The HotWindowCache used for every request.
+        """
+        super().__init__(address, QueryHandler)
+        self.csv_directory = csv_directory
+        self.sensors = {sensor_name(title): (topic, title) for topic, title in csv_files.items()}
+        self.cache = cache
+
+    def path(self, sensor):
+        return os.path.join(self.csv_directory, self.sensors[sensor][1])
+
+def run(csv_directory, csv_files, host, port, hot_seconds=DEFAULT_HOT_SECONDS, max_blocks=None):
+    """
+    Serves the query API until interrupted.
+    :param csv_directory: The directory containing the CSV files.
+    :param csv_files: A dictionary mapping each MQTT topic to its CSV file name.
+    :param host: The address to listen on.
+    :param port: The port to listen on.
+    :param hot_seconds: Seconds before now within which rows are cached.
+    :param max_blocks: Maximum number of cached blocks (defaults to the hot window of every file).
+    """
+    max_blocks = max_blocks or blocks_for(hot_seconds, len(csv_files))
+    server = QueryServer((host, port), csv_directory, csv_files, HotWindowCache(max_blocks, hot_seconds))
+    print(f"Serving {csv_directory} on http://{host}:{server.server_port}/sensors")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Exiting program.")
+    finally:
+        server.server_close()
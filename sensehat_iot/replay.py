@@ -0,0 +1,184 @@
+"""
+Replays the CSV files written by the Task3 logger to the MQTT broker.
+
+The per-sensor files are merged by timestamp while they are read line by line, so
+files of any size can be replayed without loading them into memory. Each row is
+re-published to the topic it was originally logged from, at real-time speed, N times
+faster, or as fast as possible. Every message carries the original read time of
+its row, so the replayed data keeps its timestamps. With restamp, messages carry the
+time they are re-published instead, e.g. for load tests against a logger that is
+also logging live data.
+"""
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+
+from sensehat_iot import clock
+
+# Number of messages published between two waits for paho's send buffer to drain.
+DRAIN_EVERY = 500
+# Number of messages between two progress printouts.
+PROGRESS_EVERY = 10000
+# Seconds to wait for the broker to accept the connection.
+CONNECT_TIMEOUT = 10
+
+def parse_row(line):
+    """
+    Parses one row of a logger CSV file.
+    :param line: A line such as "1714557600123456789, 23.45", or "2024-05-01 10:00:00, 23.45" in older files.
+    :return: A (nanoseconds since the Unix epoch, value string) tuple, or None if the line is not a valid row.
+    """
+    timestamp, _, value = line.partition(',')
+    timestamp = timestamp.strip()
+    value = value.strip()
+    if not value:
+        return None
+    if timestamp.isdigit():
+        return int(timestamp), value
+    if len(timestamp) != 19:
+        return None
+    try:
+        # Slicing the fixed "YYYY-MM-DD HH:MM:SS" layout is much faster than strptime.
+        moment = datetime(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]),
+                          int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19]))
+    except ValueError:
+        return None
+    return int(moment.timestamp()) * clock.NS_PER_SECOND, value
+
+def read_rows(path, topic):
+    """
+    Yields the rows of one logger CSV file, one line at a time.
+    :param path: The path of the CSV file.
+    :param topic: The MQTT topic the file was logged from.
+    :return: A generator of (nanoseconds, topic, value string) tuples in file order.
+    """
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            row = parse_row(line)
+            if row is not None:
+                yield row[0], topic, row[1]
+
+def merged_rows(csv_directory, csv_files):
+    """
+    Merges the rows of all logger CSV files by timestamp.
+    :param csv_directory: The directory containing the CSV files.
+    :param csv_files: A dictionary mapping each MQTT topic to its CSV file name.
+    :return: A generator of (nanoseconds, topic, value string) tuples in timestamp order.
+    """
+    streams = []
+    for topic, title in csv_files.items():
+        path = os.path.join(csv_directory, title)
+        if os.path.exists(path):
+            streams.append(read_rows(path, topic))
+        else:
+            print(f"Skipping missing file {path}")
+    # Each file is already in time order, so a streaming k-way merge is enough.
+    return heapq.merge(*streams, key=lambda row: row[0])
+
+def replay(rows, client, speed=1.0, qos=0, restamp=False):
+    """
+    Publishes rows to the MQTT broker, keeping their original spacing in time.
+    :param rows: An iterable of (nanoseconds, topic, value string) tuples in timestamp order.
+    :param client: A connected paho MQTT client with its network loop running.
+    :param speed: Replay speed relative to real time (e.g. 10 for ten times faster); 0 means no delays.
+    :param qos: The QoS level used for every message.
+    :param restamp: Whether messages carry the time they are published instead of the time of their row.
+    :return: The number of messages published.
+    :raises RuntimeError: If a message cannot be published, e.g. because the connection was lost.
+    """
+    count = 0
+    first_time = None
+    start = time.monotonic()
+    info = None
+    for row_time, topic, value in rows:
+        if first_time is None:
+            first_time = row_time
+        if speed > 0:
+            # Sleep until this row is due relative to the first one.
+            delay = start + (row_time - first_time) / clock.NS_PER_SECOND / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        try:
+            payload = clock.encode_reading('value', float(value), clock.now_ns() if restamp else row_time)
+        except ValueError:
+            continue
+        info = client.publish(topic, payload, qos=qos, retain=False)
+        # 0 is MQTT_ERR_SUCCESS; anything else (e.g. no connection) would silently drop the rest of the replay.
+        if info.rc != 0:
+            raise RuntimeError(f"publishing message {count + 1} failed with error code {info.rc}")
+        count += 1
+        # Let paho catch up regularly so its send buffer stays bounded at maximum speed.
+        if count % DRAIN_EVERY == 0:
+            info.wait_for_publish()
+        if count % PROGRESS_EVERY == 0:
+            print(f"Replayed {count} messages ({clock.format_ns(row_time)})")
+
+    if info is not None:
+        info.wait_for_publish()
+    return count
+
+def connect(broker, port):
+    """
+    Connects to the MQTT broker and waits until it has accepted the connection.
+    :param broker: The MQTT broker address.
+    :param port: The MQTT broker port.
+    :return: The connected paho MQTT client, with its network loop running.
+    :raises RuntimeError: If the broker rejects the connection or does not answer within CONNECT_TIMEOUT.
+    :raises OSError: If the broker cannot be reached.
+    """
+    import paho.mqtt.client as mqtt
+
+    connected = threading.Event()
+    result = []
+
+    def on_connect(client, userdata, flags, rc, properties=None):
+        result.append(rc)
+        connected.set()
+
+    client = mqtt.Client(protocol=mqtt.MQTTv5)
+    client.on_connect = on_connect
+    client.connect(broker, port, 60)
+    client.loop_start()
+    if not connected.wait(CONNECT_TIMEOUT) or result[0] != 0:
+        client.loop_stop()
+        client.disconnect()
+        reason = f"return code {result[0]}" if result else f"no answer within {CONNECT_TIMEOUT} s"
+        raise RuntimeError(f"the broker at {broker}:{port} refused the connection ({reason})")
+    return client
+
+def run(csv_directory, csv_files, broker, port, speed, qos, restamp=False):
+    """
+    Connects to the MQTT broker and replays the logger CSV files.
+    :param csv_directory: The directory containing the CSV files.
+    :param csv_files: A dictionary mapping each MQTT topic to its CSV file name.
+    :param broker: The MQTT broker address.
+    :param port: The MQTT broker port.
+    :param speed: Replay speed relative to real time; 0 means as fast as possible.
+    :param qos: The QoS level used for every message.
+    :param restamp: Whether messages carry the time they are published instead of the time of their row.
+    :return: The process exit code: 0 on success, 1 if the replay could not be completed.
+    """
+    try:
+        client = connect(broker, port)
+    except (OSError, RuntimeError) as e:
+        print(f"Cannot replay: {e}")
+        return 1
+    try:
+        start = time.monotonic()
+        count = replay(merged_rows(csv_directory, csv_files), client, speed, qos, restamp)
+        elapsed = time.monotonic() - start
+        rate = count / elapsed if elapsed > 0 else 0
+        print(f"Replayed {count} messages in {elapsed:.1f} s ({rate:.0f} messages/s)")
+    except KeyboardInterrupt:
+        print("Exiting program.")
+    except (RuntimeError, ValueError) as e:
+        # paho's wait_for_publish() raises RuntimeError or ValueError when the connection drops.
+        print(f"Replay stopped: {e}")
+        return 1
+    finally:
+        client.loop_stop()
+        client.disconnect()
+    return 0
@@ -0,0 +1,262 @@
+"""
+One hardware reader shared by many consumers.
+
+A Sampler thread owns the Sense HAT sensors and stores every reading in a Snapshot.
+Consumers read the latest sample through a SnapshotSense object, which has the same
+sensor getters as SenseHat, so the task scripts work with it unchanged. Consumers in
+the same process share the Snapshot directly; other processes attach to the
+SnapshotServer's Unix socket with a SnapshotSubscriber.
+"""
+import json
+import os
+import socket
+import threading
+import time
+
+from sensehat_iot import clock
+from sensehat_iot.defaults import DEFAULT_INTERVAL, DEFAULT_SOCKET_PATH
+# Seconds a consumer waits for the first sample, or for a new one after the samples went stale, before giving up.
+FIRST_SAMPLE_TIMEOUT = 10.0
+# Number of sampler intervals after which a sample is too old to be used.
+STALE_INTERVALS = 3
+# Seconds the server waits for a slow client to accept a sample before disconnecting it.
+SEND_TIMEOUT = 0.05
+# Seconds a subscriber waits before reconnecting to the sampler.
+RECONNECT_DELAY = 1.0
+
+# Map each SenseHat sensor getter to the key its value is stored under in a sample.
+SENSOR_GETTERS = {
+    'get_temperature': 'temperature',
+    'get_temperature_from_pressure': 'temperature_from_pressure',
+    'get_pressure': 'pressure',
+    'get_humidity': 'humidity',
+    'get_compass': 'compass',
+}
+
+def read_sample(sense):
+    """
+    Reads every sensor once.
+    :param sense: A SenseHat instance.
+    :return: A dictionary of sensor values keyed as in SENSOR_GETTERS, plus the read time in nanoseconds
+             since the Unix epoch under 'ns'. The Sampler adds its interval in seconds under 'interval'.
+    """
+    read_ns = clock.now_ns()
+    sample = {key: getattr(sense, getter)() for getter, key in SENSOR_GETTERS.items()}
+    sample['ns'] = read_ns
+    return sample
+
+class Snapshot:
+    """
+    Holds the latest sample and a sequence number that increases with every update.
+    Samples are replaced, never modified, so readers can use them without copying.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sample = None
+        self.seq = 0
+        self.updated = None
+
+    def update(self, sample):
+        """
+        Replaces the latest sample and wakes up waiting readers.
+        :param sample: The new sample dictionary.
+        """
+        with self.condition:
+            self.sample = sample
+            self.seq += 1
+            self.updated = time.monotonic()
+            self.condition.notify_all()
+
+    def latest(self, timeout=FIRST_SAMPLE_TIMEOUT):
+        """
+        Returns the latest sample, waiting for the first one if necessary.
+        A sample older than STALE_INTERVALS sampler intervals is not returned: the sampler has
+        stopped or cannot read the sensors, so a new sample is waited for instead.
+        :param timeout: Seconds to wait for the first or a new sample.
+        :return: The latest sample dictionary.
+        :raises TimeoutError: If no usable sample arrives within the timeout.
+        """
+        with self.condition:
+            sample, seq, updated = self.sample, self.seq, self.updated
+        if sample is None:
+            return self.wait_for(0, timeout)[1]
+        age = time.monotonic() - updated
+        if age <= sample.get('interval', DEFAULT_INTERVAL) * STALE_INTERVALS:
+            return sample
+        try:
+            return self.wait_for(seq, timeout)[1]
+        except TimeoutError:
+            raise TimeoutError(f"The latest sample is {age + timeout:.1f} s old; is the sampler running?") from None
+
+    def wait_for(self, after_seq, timeout=None):
+        """
+        Waits until a sample newer than after_seq is available.
+        :param after_seq: The sequence number of the last sample the caller has seen.
+        :param timeout: Seconds to wait (None to wait forever).
+        :return: A (sequence number, sample) tuple.
+        :raises TimeoutError: If no newer sample arrives within the timeout.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq > after_seq, timeout):
+                raise TimeoutError("No sample received from the sampler")
+            return self.seq, self.sample
+
+class SnapshotSense:
+    """
+    Stands in for SenseHat in the task scripts.
+    The sensor getters return values from the shared snapshot instead of reading the
+    hardware; everything else (LED matrix, joystick) is forwarded to a real SenseHat,
+    which is only created when it is first needed.
+
+    read_ns() pins the latest sample: the getters then return its values until the next
+    call, so a reading cycle that starts with read_ns() gets a timestamp and values that
+    all come from one sample. Before the first call, every getter uses the latest sample.
+    """
+
+    def __init__(self, snapshot, hardware_factory):
+        """
+        :param snapshot: The Snapshot to read sensor values from.
+        :param hardware_factory: A callable returning the SenseHat used for the LED matrix and joystick.
+        """
+        self._snapshot = snapshot
+        self._hardware_factory = hardware_factory
+        self._hardware = None
+        self._lock = threading.Lock()
+        # The sample pinned by read_ns(), or None to use the latest sample for every getter.
+        self._pinned = None
+
+    def read_ns(self):
+        """
+        Pins the latest sample for the sensor getters.
+        :return: The read time of the pinned sample, in nanoseconds since the Unix epoch.
+        """
+        self._pinned = self._snapshot.latest()
+        return self._pinned['ns']
+
+    def _sample(self):
+        return self._pinned if self._pinned is not None else self._snapshot.latest()
+
+    def __getattr__(self, name):
+        if name in SENSOR_GETTERS:
+            key = SENSOR_GETTERS[name]
+            return lambda: self._sample()[key]
+        with self._lock:
+            if self._hardware is None:
+                self._hardware = self._hardware_factory()
+        return getattr(self._hardware, name)
+
+class Sampler(threading.Thread):
+    """
+    Background thread that reads the sensors at a fixed interval and updates a Snapshot.
+    """
+
+    def __init__(self, sense, snapshot, interval=DEFAULT_INTERVAL):
+        """
+        :param sense: The SenseHat instance that owns the sensors.
+        :param snapshot: The Snapshot to update.
+        :param interval: Seconds between two reads.
+        """
+        super().__init__(name='sensehat-sampler', daemon=True)
+        self.sense = sense
+        self.snapshot = snapshot
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_read = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                sample = read_sample(self.sense)
+                # Consumers use the interval to recognise samples that are too old.
+                sample['interval'] = self.interval
+                self.snapshot.update(sample)
+            except Exception as e:
+                # Keep sampling; consumers see the previous sample until it is STALE_INTERVALS old.
+                print(f"Error reading sensors: {e}")
+            next_read += self.interval
+            self.stopped.wait(max(0.0, next_read - time.monotonic()))
+
+    def stop(self):
+        self.stopped.set()
+
+class SnapshotServer(threading.Thread):
+    """
+    Publishes every new sample of a Snapshot to the processes connected to a Unix socket.
+    Each sample is sent as one line of JSON. Clients that fall behind are disconnected,
+    so a slow consumer never delays the others.
+    """
+
+    def __init__(self, snapshot, path=DEFAULT_SOCKET_PATH):
+        """
+        :param snapshot: The Snapshot to publish.
+        :param path: The filesystem path of the Unix socket.
+        """
+        super().__init__(name='sensehat-sampler-server', daemon=True)
+        self.snapshot = snapshot
+        self.path = path
+        self.clients = []
+        self.lock = threading.Lock()
+        # Remove a socket left behind by a previous run before binding.
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        threading.Thread(target=self._accept, name='sensehat-sampler-accept', daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            client.settimeout(SEND_TIMEOUT)
+            with self.lock:
+                self.clients.append(client)
+
+    def run(self):
+        seq = 0
+        while True:
+            seq, sample = self.snapshot.wait_for(seq)
+            line = (json.dumps(sample) + '\n').encode()
+            with self.lock:
+                clients = list(self.clients)
+            for client in clients:
+                try:
+                    client.sendall(line)
+                except OSError:
+                    # The client has gone away or is not reading fast enough.
+                    with self.lock:
+                        self.clients.remove(client)
+                    client.close()
+
+    def close(self):
+        self.server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class SnapshotSubscriber(threading.Thread):
+    """
+    Keeps a local Snapshot up to date with the samples published by a SnapshotServer.
+    Reconnects automatically if the sampler is restarted.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        """
+        :param path: The filesystem path of the sampler's Unix socket.
+        """
+        super().__init__(name='sensehat-sampler-subscriber', daemon=True)
+        self.path = path
+        self.snapshot = Snapshot()
+
+    def run(self):
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                    connection.connect(self.path)
+                    for line in connection.makefile('rb'):
+                        self.snapshot.update(json.loads(line))
+            except (OSError, ValueError) as e:
+                print(f"Sampler connection lost ({e}), reconnecting...")
+            time.sleep(RECONNECT_DELAY)
@@ -0,0 +1,189 @@
+"""
+Multi-process writer for the logger's CSV files.
+
+Messages are handed to worker processes through bounded queues, sharded by topic,
+so every file is owned by exactly one worker. The MQTT network thread only
+enqueues, and a slow write to the SD card no longer stalls the receipt of messages.
+When a queue is full, submit() blocks, which pushes back on the broker connection
+instead of growing memory. A worker that cannot write a row (e.g. the SD card is
+full) reports it and carries on with the next one; if a worker dies anyway,
+submit() raises instead of waiting forever for its queue.
+
+The workers are started from a fork server rather than forked from the caller,
+which may already run other threads (e.g. under `sampler --run log`); forking a
+multi-threaded process can deadlock the child on a lock held by another thread.
+The row formatter is therefore passed by reference and must be importable.
+"""
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import time
+import zlib
+
+# Maximum number of messages waiting in each worker's queue.
+QUEUE_SIZE = 10000
+# Maximum number of messages a worker takes from its queue before writing them.
+BATCH_SIZE = 500
+# Seconds between two flushes of a worker's files to disk.
+FLUSH_INTERVAL = 0.5
+# Seconds between two checks that a worker is still alive while its queue is full.
+PUT_TIMEOUT = 1.0
+
+def format_row(ns, value):
+    """
+    Formats a sensor reading along with its timestamp as one row of the logger's CSV files.
+    The timestamp is stored as an integer; it is only formatted as a date when displayed.
+    :param ns: The time the sensor was read, in nanoseconds since the Unix epoch.
+    :param value: The sensor reading.
+    :return: The CSV row, e.g. "1714557600123456789, 23.45\n".
+    """
+    # Format the reading to two decimal places.
+    return f"{ns}, {value:.2f}\n"
+
+def _write_shard(directory, format_row, messages, echo):
+    """
+    Worker process: writes the messages of one shard to their CSV files.
+    Files are kept open and flushed every FLUSH_INTERVAL seconds or when the queue is idle.
+    :param directory: The directory containing the CSV files.
+    :param format_row: A function (timestamp, value) -> CSV row text.
+    :param messages: The queue of (title, timestamp, value) tuples; None stops the worker.
+    :param echo: True to print every row written, so the console output costs the network thread nothing.
+    """
+    # Ctrl+C is handled by the parent, which stops the workers once their queues are drained.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    files = {}
+    last_flush = time.monotonic()
+    running = True
+    try:
+        while running:
+            batch = []
+            try:
+                batch.append(messages.get(timeout=FLUSH_INTERVAL))
+                while len(batch) < BATCH_SIZE:
+                    batch.append(messages.get_nowait())
+            except queue.Empty:
+                pass
+
+            for item in batch:
+                if item is None:
+                    running = False
+                    break
+                title, timestamp, value = item
+                try:
+                    row = format_row(timestamp, value)
+                except ValueError as e:
+                    print(f"Skipping invalid data for {title}: {e}")
+                    continue
+                try:
+                    file = files.get(title)
+                    if file is None:
+                        file = files[title] = open(os.path.join(directory, title), mode="a", encoding="utf-8")
+                    file.write(row)
+                except OSError as e:
+                    # Drop the row and the file; it is opened again for the next row.
+                    print(f"Cannot write to {title}: {e}")
+                    _close(files, title)
+                    continue
+                if echo:
+                    print(f"{title}: {row}", end='')
+
+            now = time.monotonic()
+            if not batch or now - last_flush >= FLUSH_INTERVAL:
+                for title, file in list(files.items()):
+                    try:
+                        file.flush()
+                    except OSError as e:
+                        print(f"Cannot write to {title}: {e}")
+                        _close(files, title)
+                if echo:
+                    sys.stdout.flush()
+                last_flush = now
+    finally:
+        for title in list(files):
+            _close(files, title)
+
+def _close(files, title):
+    """
+    Closes a file of a worker, if it is open, and forgets it. Errors writing its buffered rows are reported.
+    """
+    file = files.pop(title, None)
+    if file is None:
+        return
+    try:
+        file.close()
+    except OSError as e:
+        print(f"Cannot write to {title}: {e}")
+
+class ShardedWriter:
+    """
+    Distributes messages to worker processes sharded by topic.
+    """
+
+    def __init__(self, directory, format_row=format_row, workers=None, topics=(), queue_size=QUEUE_SIZE,
+                 echo=False):
+        """
+        :param directory: The directory containing the CSV files.
+        :param format_row: A function (timestamp, value) -> CSV row text, run in the workers. It must be a
+                           module-level function of an importable module, so the workers can import it.
+        :param workers: The number of worker processes (defaults to the number of CPU cores).
+        :param topics: The known topics, assigned to the workers in turn so they are spread evenly.
+                       Other topics are assigned by a hash of their name.
+        :param queue_size: The maximum number of messages waiting for each worker.
+        :param echo: True to print every row from the workers.
+        """
+        context = multiprocessing.get_context('forkserver')
+        workers = workers or os.cpu_count() or 1
+        self.shards = {topic: index % workers for index, topic in enumerate(topics)}
+        self.queues = [context.Queue(queue_size) for _ in range(workers)]
+        self.processes = [
+            context.Process(target=_write_shard, args=(directory, format_row, messages, echo),
+                            name=f'csv-writer-{index}', daemon=True)
+            for index, messages in enumerate(self.queues)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def submit(self, topic, title, timestamp, value):
+        """
+        Hands one message to the worker that owns its topic. Blocks while that worker's queue is full.
+        :param topic: The MQTT topic, used to choose the worker.
+        :param title: The file name of the CSV file to write to.
+        :param timestamp: The time of the reading, in nanoseconds since the Unix epoch.
+        :param value: The decoded reading.
+        :raises RuntimeError: If the worker has stopped.
+        """
+        shard = self.shards.get(topic)
+        if shard is None:
+            # crc32 is stable across processes and runs, unlike hash() on strings.
+            shard = zlib.crc32(topic.encode()) % len(self.queues)
+        self._put(shard, (title, timestamp, value))
+
+    def _put(self, shard, item):
+        """
+        Puts an item on a worker's queue, waiting while it is full as long as the worker is alive.
+        :raises RuntimeError: If the worker has stopped, so its queue would never be emptied.
+        """
+        process = self.processes[shard]
+        while True:
+            if not process.is_alive():
+                raise RuntimeError(f"{process.name} has stopped (exit code {process.exitcode})")
+            try:
+                self.queues[shard].put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def close(self):
+        """
+        Writes every queued message, then stops the worker processes.
+        Workers that have already stopped are reported and skipped.
+        """
+        for shard in range(len(self.queues)):
+            try:
+                self._put(shard, None)
+            except RuntimeError as e:
+                print(f"Cannot stop the CSV writer: {e}")
+        for process in self.processes:
+            process.join()
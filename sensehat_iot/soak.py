@@ -0,0 +1,370 @@
+"""
+Soak-test harness: runs a mode for a simulated multi-day period and checks for drift.
+
+The mode runs unchanged against a fake Sense HAT, a local MQTT broker and (for the
+cloud modes) a stub Adafruit IO server. Its calls to time.sleep() advance a virtual
+clock instead of waiting, so days of operation pass in minutes for the modes whose
+cycles cost little real time. The plot mode renders a frame for every simulated
+second, so it runs at matplotlib's speed instead. Each sleep marks the end of one
+cycle of the mode's loop. At a fixed virtual interval the harness records
+the process RSS, open file descriptors, thread count and per-cycle latency. The run
+fails when any of them grows by more than its budget between the end of the warm-up
+and the end of the run.
+"""
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time as real_time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sensehat_iot import clock as timestamps
+
+class SoakFinished(BaseException):
+    """
+    Raised from the virtual clock when the simulated duration is over.
+    It derives from BaseException so that the modes' "except Exception" handlers let it through.
+    """
+
+# --- Fake Hardware ---
+class FakeStick:
+    """
+    Joystick that presses "up" once, so the logger subscribes to a topic and starts publishing.
+    """
+
+    def __init__(self):
+        self.pressed = False
+
+    def get_events(self):
+        if self.pressed:
+            return []
+        self.pressed = True
+        return [type('InputEvent', (), {'direction': 'up', 'action': 'released'})()]
+
+class FakeSenseHat:
+    """
+    Sense HAT with random-walk sensor readings and a no-op LED matrix.
+    """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.values = {'temperature': 21.0, 'pressure': 1013.0, 'humidity': 45.0, 'compass': 180.0}
+        self.stick = FakeStick()
+
+    def _walk(self, key, step):
+        self.values[key] += self.random.uniform(-step, step)
+        return self.values[key]
+
+    def get_temperature(self):
+        return self._walk('temperature', 0.05)
+
+    def get_temperature_from_pressure(self):
+        return self.values['temperature'] + 0.5
+
+    def get_pressure(self):
+        return self._walk('pressure', 0.1)
+
+    def get_humidity(self):
+        return self._walk('humidity', 0.1)
+
+    def get_compass(self):
+        return self._walk('compass', 1.0) % 360
+
+    def clear(self, *args, **kwargs):
+        pass
+
+    def show_message(self, *args, **kwargs):
+        pass
+
+    def show_letter(self, *args, **kwargs):
+        pass
+
+# --- Virtual Clock ---
+class VirtualClock:
+    """
+    Stands in for the time module inside a mode. sleep() advances the virtual time
+    immediately (or after sleeping the given fraction of the requested time), and
+    time(), monotonic() and the formatting functions report the virtual time.
+    Every other attribute is taken from the real time module.
+    """
+
+    def __init__(self, duration, sample_interval, warmup, on_sample, real_fraction=0.0):
+        """
+        :param duration: Simulated seconds after which the run stops.
+        :param sample_interval: Simulated seconds between two metric samples.
+        :param warmup: Simulated seconds before the baseline sample is taken.
+        :param on_sample: Function called with (virtual elapsed seconds, cycle latencies) at every sample.
+        :param real_fraction: Fraction of every requested sleep that is really slept (0 for none).
+        """
+        self.start_epoch = real_time.time()
+        self.elapsed = 0.0
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self.next_sample = warmup
+        self.on_sample = on_sample
+        self.real_fraction = real_fraction
+        self.latencies = []
+        self.last_wake = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(real_time, name)
+
+    def time(self):
+        return self.start_epoch + self.elapsed
+
+    def time_ns(self):
+        return int(self.time() * 1e9)
+
+    def monotonic(self):
+        return self.elapsed
+
+    def monotonic_ns(self):
+        return int(self.elapsed * 1e9)
+
+    def localtime(self, seconds=None):
+        return real_time.localtime(self.time() if seconds is None else seconds)
+
+    def gmtime(self, seconds=None):
+        return real_time.gmtime(self.time() if seconds is None else seconds)
+
+    def strftime(self, format, t=None):
+        return real_time.strftime(format, self.localtime() if t is None else t)
+
+    def sleep(self, seconds):
+        now = real_time.perf_counter()
+        with self.lock:
+            # The real time spent since the previous sleep is the latency of one loop cycle.
+            if self.last_wake is not None:
+                self.latencies.append(now - self.last_wake)
+            self.elapsed += seconds
+            if self.elapsed >= self.next_sample:
+                latencies, self.latencies = self.latencies, []
+                self.on_sample(self.elapsed, latencies)
+                self.next_sample += self.sample_interval
+            finished = self.elapsed >= self.duration
+        if finished:
+            raise SoakFinished()
+        if self.real_fraction > 0:
+            real_time.sleep(seconds * self.real_fraction)
+        self.last_wake = real_time.perf_counter()
+
+# --- Plot Driver ---
+class PlotDriver:
+    """
+    Stands in for matplotlib.pyplot inside the plot mode. show() draws frames until the
+    virtual clock finishes the run, instead of returning at once as it does off-screen,
+    so the frames run while the mode's MQTT client is still connected.
+    Every other attribute is taken from pyplot.
+    """
+
+    def __init__(self, module, pyplot):
+        """
+        :param module: The loaded module of the plot mode.
+        :param pyplot: The matplotlib.pyplot module.
+        """
+        self.module = module
+        self.pyplot = pyplot
+
+    def __getattr__(self, name):
+        return getattr(self.pyplot, name)
+
+    def show(self, *args, **kwargs):
+        frame = 0
+        while True:
+            self.module.update_plot(frame)
+            self.module.fig.canvas.draw()
+            frame += 1
+
+def drive_plot(module):
+    """
+    Makes the plot mode's plt.show() draw frames once its dependencies are loaded.
+    :param module: The loaded module of the plot mode.
+    """
+    load_dependencies = module.load_dependencies
+
+    def load_and_drive():
+        load_dependencies()
+        module.plt = PlotDriver(module, module.plt)
+
+    module.load_dependencies = load_and_drive
+
+# --- Process Metrics ---
+def process_metrics():
+    """
+    Measures the resources used by this process.
+    :return: A dictionary with the RSS in MB, the open file descriptors and the thread count.
+    """
+    with open('/proc/self/statm') as statm:
+        resident_pages = int(statm.read().split()[1])
+    return {
+        'rss_mb': round(resident_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 2),
+        'fds': len(os.listdir('/proc/self/fd')),
+        'threads': threading.active_count(),
+    }
+
+def latency_summary(latencies):
+    """
+    Summarises the cycle latencies of one sample window.
+    :param latencies: Cycle latencies in seconds.
+    :return: A dictionary with the number of cycles and the median and 95th percentile in ms.
+    """
+    if not latencies:
+        return {'cycles': 0, 'p50_ms': 0.0, 'p95_ms': 0.0}
+    ordered = sorted(latencies)
+    return {
+        'cycles': len(ordered),
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+    }
+
+# --- Stub Adafruit IO Server ---
+class StubAdafruitIO(BaseHTTPRequestHandler):
+    """
+    Minimal Adafruit IO REST API: data can be created, and reading a feed's data returns no points.
+    """
+    next_id = 0
+
+    def _reply(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._reply([])
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        StubAdafruitIO.next_id += 1
+        data.update({'id': str(StubAdafruitIO.next_id), 'created_at': real_time.strftime('%Y-%m-%dT%H:%M:%SZ', real_time.gmtime())})
+        self._reply(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_adafruit_io():
+    """
+    Starts the stub Adafruit IO server on a free local port.
+    :return: The running ThreadingHTTPServer.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubAdafruitIO)
+    threading.Thread(target=server.serve_forever, name='stub-adafruit-io', daemon=True).start()
+    return server
+
+# --- Soak Run ---
+def check_budgets(samples, budgets):
+    """
+    Compares the first (post warm-up) and last samples against the growth budgets.
+    :param samples: The recorded samples, oldest first.
+    :param budgets: A dictionary with rss_mb, fds, threads and latency_ratio budgets.
+    :return: A list of messages describing every exceeded budget.
+    """
+    if len(samples) < 2:
+        return ["Not enough samples to measure growth; increase the duration or reduce the sample interval"]
+    first, last = samples[0], samples[-1]
+    failures = []
+    for key in ('rss_mb', 'fds', 'threads'):
+        growth = last[key] - first[key]
+        if growth > budgets[key]:
+            failures.append(f"{key} grew by {growth:g} (budget {budgets[key]:g})")
+    # Ignore sub-millisecond latencies, which are dominated by noise.
+    baseline = max(first['p95_ms'], 1.0)
+    if last['p95_ms'] > baseline * budgets['latency_ratio']:
+        failures.append(f"p95 cycle latency grew from {first['p95_ms']} ms to {last['p95_ms']} ms "
+                        f"(budget x{budgets['latency_ratio']:g})")
+    return failures
+
+def run(module, mode, duration, sample_interval, warmup, budgets, broker=None, real_fraction=0.0,
+        report_path=None, show_output=False, workdir=None):
+    """
+    Soak-tests one mode.
+    :param module: The loaded module of the mode.
+    :param mode: The name of the mode.
+    :param duration: Simulated seconds to run for.
+    :param sample_interval: Simulated seconds between two metric samples.
+    :param warmup: Simulated seconds before the baseline sample.
+    :param budgets: A dictionary with rss_mb, fds, threads and latency_ratio budgets.
+    :param broker: MQTT broker address to use instead of the mode's default.
+    :param real_fraction: Fraction of every sleep that is really slept.
+    :param report_path: Optional path of a JSON file receiving every sample.
+    :param show_output: True to show the mode's own console output.
+    :param workdir: Directory for the files written by the mode (CSV logs, caches).
+    :return: True if every budget was respected.
+    """
+    samples = []
+    console = open(os.devnull, 'w') if not show_output else None
+    real_stdout = sys.stdout
+
+    def on_sample(elapsed, latencies):
+        sample = {'hours': round(elapsed / 3600, 2), **process_metrics(), **latency_summary(latencies)}
+        samples.append(sample)
+        print(f"{sample['hours']:>8.2f} h  rss {sample['rss_mb']:>8.2f} MB  fds {sample['fds']:>4}  "
+              f"threads {sample['threads']:>3}  cycles {sample['cycles']:>7}  "
+              f"p50 {sample['p50_ms']:>8.3f} ms  p95 {sample['p95_ms']:>8.3f} ms", file=real_stdout, flush=True)
+
+    clock = VirtualClock(duration, sample_interval, warmup, on_sample, real_fraction)
+    # Replace the mode's view of time: "import time" and "from time import sleep" are both covered.
+    if hasattr(module, 'time'):
+        module.time = clock
+    if hasattr(module, 'sleep'):
+        module.sleep = clock.sleep
+    # Payload and CSV timestamps come from sensehat_iot.clock; anchor it on the virtual time as well.
+    timestamps.time = clock
+    timestamps._clock.anchor()
+    # Point the mode at the local broker, the stub cloud server and a scratch directory.
+    if broker and hasattr(module, 'MQTT_BROKER'):
+        module.MQTT_BROKER = broker
+    stub = None
+    if mode.startswith('cloud-'):
+        stub = start_stub_adafruit_io()
+        os.environ['ADAFRUIT_IO_BASE_URL'] = f'http://127.0.0.1:{stub.server_port}'
+        os.environ.setdefault('ADAFRUIT_IO_USERNAME', 'soak')
+        os.environ.setdefault('ADAFRUIT_IO_KEY', 'soak')
+    if workdir:
+        os.environ['ADAFRUIT_IO_CACHE'] = os.path.join(workdir, 'adafruit_io_cache.db')
+        if hasattr(module, 'csv_directory'):
+            module.csv_directory = workdir
+    # The logger's writer processes print to the real console, which the redirection below does not cover.
+    if not show_output and hasattr(module, 'print_rows'):
+        module.print_rows = False
+    if mode == 'plot':
+        # Render off-screen, with the frames drawn from within plt.show().
+        os.environ['MPLBACKEND'] = 'Agg'
+        drive_plot(module)
+
+    print(f"Soak-testing '{mode}' for {duration / 86400:g} simulated days, "
+          f"sampling every {sample_interval / 3600:g} h after a {warmup / 3600:g} h warm-up", flush=True)
+    try:
+        with contextlib.redirect_stdout(console) if console else contextlib.nullcontext():
+            module.main(FakeSenseHat())
+    except SoakFinished:
+        pass
+    except OSError as e:
+        # Typically no MQTT broker is listening.
+        target = f" (MQTT broker {module.MQTT_BROKER})" if hasattr(module, 'MQTT_BROKER') else ''
+        print(f"FAIL: '{mode}' stopped with an error{target}: {e}")
+        return False
+    finally:
+        timestamps.time = real_time
+        timestamps._clock.anchor()
+        if console:
+            console.close()
+        if stub:
+            stub.shutdown()
+
+    if report_path:
+        with open(report_path, 'w') as report:
+            json.dump(samples, report, indent=2)
+
+    failures = check_budgets(samples, budgets)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("PASS: no growth beyond the budgets")
+    return not failures
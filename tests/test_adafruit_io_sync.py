@@ -0,0 +1,137 @@
+"""
+Tests the Adafruit IO feed cache of Task 4.2 against a stub REST server.
+
+Run from the project root:
+    python3 -m unittest discover tests
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import clock  # noqa: E402
+from sensehat_iot.cli import load_mode  # noqa: E402
+
+class StubFeedServer(BaseHTTPRequestHandler):
+    """
+    Serves the data of one feed like the Adafruit IO REST API: newest points first,
+    filtered by start_time/end_time (inclusive) and cut to limit.
+    Requests whose number is in `failures` are answered with 429 Too Many Requests.
+    """
+    points = []
+    requests = 0
+    failures = set()
+    point_ns = None
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests += 1
+        if cls.requests in cls.failures:
+            self.send_error(429, 'Too Many Requests')
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        start_ns = cls.point_ns({'created_at': query['start_time'][0]})
+        end_ns = cls.point_ns({'created_at': query['end_time'][0]}) if 'end_time' in query else None
+        page = [point for point in sorted(cls.points, key=lambda point: -point['created_epoch'])
+                if round(point['created_epoch'] * 1e9) >= start_ns
+                and (end_ns is None or round(point['created_epoch'] * 1e9) <= end_ns)]
+        body = json.dumps(page[:int(query['limit'][0])]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FeedSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = load_mode('cloud-display')
+        # Only the clock is needed; the Sense HAT and dotenv are not used by the cache.
+        self.module.clock = clock
+        self.module.PAGE_SIZE = 10
+        self.module.ADAFRUIT_IO_USERNAME = 'test'
+        StubFeedServer.point_ns = staticmethod(self.module.point_ns)
+        StubFeedServer.requests = 0
+        StubFeedServer.failures = set()
+        StubFeedServer.points = []
+        self.add_points(100)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubFeedServer)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.module.ADAFRUIT_IO_BASE_URL = f'http://127.0.0.1:{self.server.server_port}'
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = self.module.open_cache(os.path.join(self.directory.name, 'cache.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def add_points(self, count):
+        """
+        Adds points one second apart after the existing ones; the first points end one second ago.
+        """
+        start = len(StubFeedServer.points)
+        first = StubFeedServer.points[-1]['created_epoch'] + 1 if start else time.time() - count
+        for index in range(count):
+            StubFeedServer.points.append({'id': str(start + index), 'value': str(start + index),
+                                          'created_epoch': round(first + index, 3)})
+
+    def cached(self):
+        return self.db.execute("SELECT COUNT(*) FROM feed_data WHERE feed = 'temperature'").fetchone()[0]
+
+    def test_backfill_is_paged(self):
+        self.assertEqual(self.module.sync_feed(self.db, 'temperature'), 100)
+        self.assertEqual(self.cached(), 100)
+
+    def test_interrupted_backfill_is_resumed(self):
+        StubFeedServer.failures = {2}
+        with self.assertRaises(OSError):
+            self.module.sync_feed(self.db, 'temperature')
+        self.assertEqual(self.cached(), 10)
+        # The next syncs continue with the older history instead of only fetching newer points.
+        self.module.sync_feed(self.db, 'temperature')
+        self.assertEqual(self.cached(), 100)
+        self.assertEqual(self.module.load_sync_state(self.db, 'temperature')[1:], (None, None))
+
+    def test_repeated_failures_resume_where_they_stopped(self):
+        StubFeedServer.failures = {3, 5}
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                self.module.sync_feed(self.db, 'temperature')
+        self.module.sync_feed(self.db, 'temperature')
+        self.assertEqual(self.cached(), 100)
+
+    def test_points_older_than_the_backfill_window_are_removed(self):
+        old_ns = time.time_ns() - (self.module.BACKFILL_SECONDS + 3600) * clock.NS_PER_SECOND
+        old = [{'id': f'old{index}', 'value': '1', 'created_epoch': old_ns / 1e9 + index} for index in range(5)]
+        self.module.store_page(self.db, 'temperature', old)
+        self.module.store_page(self.db, 'humidity', old)
+        self.db.commit()
+        self.module.sync_feed(self.db, 'temperature')
+        self.assertEqual(self.cached(), 100)
+        # Feeds are pruned when they are synced; the newest point of a feed is always kept.
+        self.assertEqual(self.module.prune_feed(self.db, 'humidity', time.time_ns()), 4)
+        self.db.commit()
+        self.assertEqual(self.db.execute("SELECT id FROM feed_data WHERE feed = 'humidity'").fetchall(), [('old4',)])
+
+    def test_only_new_points_are_fetched_after_a_sync(self):
+        self.module.sync_feed(self.db, 'temperature')
+        self.add_points(5)
+        requests = StubFeedServer.requests
+        self.assertEqual(self.module.sync_feed(self.db, 'temperature'), 5)
+        self.assertEqual(StubFeedServer.requests - requests, 1)
+        self.assertEqual(self.cached(), 105)
+
+if __name__ == '__main__':
+    unittest.main()
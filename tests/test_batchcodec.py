@@ -0,0 +1,85 @@
+"""
+Tests the batch payload encoding, and that malformed batches cannot stop the Task 3 logger.
+
+Run from the project root:
+    python3 -m unittest discover tests
+"""
+import json
+import os
+import sys
+import types
+import unittest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import batchcodec, clock  # noqa: E402
+from sensehat_iot.cli import load_mode  # noqa: E402
+
+START_NS = 1_800_000_000_123_456_789
+
+def readings(rounds=5):
+    return [(START_NS + index * 1_000_123_456, metric, round(value + index * 0.07, 2))
+            for index in range(rounds)
+            for metric, value in (('temperature', 21.5), ('humidity', 45.07), ('pressure', 1013.05))]
+
+def body(**changes):
+    """
+    :return: An uncompressed payload with the given parts of a valid body replaced.
+    """
+    data = {'res': 1, 'scale': 100, 'metrics': {'temperature': {'t': [START_NS, 1000], 'v': [2150, 7]}}}
+    data.update(changes)
+    return bytes((batchcodec.FORMAT_VERSION, batchcodec.CODECS['none'], 0)) + json.dumps(data).encode()
+
+class BatchCodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        batch = readings()
+        for codec in batchcodec.available_codecs():
+            for dictionary_id in (0, batchcodec.DEFAULT_DICTIONARY):
+                with self.subTest(codec=codec, dictionary_id=dictionary_id):
+                    payload = batchcodec.encode_batch(batch, codec, dictionary_id)
+                    self.assertEqual(batchcodec.decode_batch(payload), batch)
+
+    def test_coarse_resolution_round_trip(self):
+        decoded = batchcodec.decode_batch(batchcodec.encode_batch(readings(), resolution_ns=1_000_000))
+        self.assertEqual([ns % 1_000_000 for ns, _, _ in decoded], [0] * len(decoded))
+        self.assertEqual([value for _, _, value in decoded], [value for _, _, value in readings()])
+
+    def test_malformed_payloads_raise_value_error(self):
+        def metrics(**column):
+            return {'temperature': {'t': [START_NS, 1000], 'v': [2150, 7], **column}}
+
+        payloads = {
+            'empty': b'',
+            'wrong version': b'\x09\x00\x00{}',
+            'unknown codec': bytes((batchcodec.FORMAT_VERSION, 9, 0)) + b'{}',
+            'unknown dictionary': bytes((batchcodec.FORMAT_VERSION, 1, 99)) + b'',
+            'corrupt zlib': bytes((batchcodec.FORMAT_VERSION, 1, 0)) + b'not zlib',
+            'not json': bytes((batchcodec.FORMAT_VERSION, 0, 0)) + b'{',
+            'not an object': bytes((batchcodec.FORMAT_VERSION, 0, 0)) + b'[1, 2]',
+            'missing metrics': body(metrics=None),
+            'zero scale': body(scale=0),
+            'negative resolution': body(res=-1),
+            'float scale': body(scale=0.5),
+            'bool resolution': body(res=True),
+            'float time': body(metrics=metrics(t=[START_NS, 0.5])),
+            'string value': body(metrics=metrics(v=[2150, '7'])),
+            'short column': body(metrics=metrics(v=[2150])),
+            'column not a list': body(metrics=metrics(t='12')),
+        }
+        for name, payload in payloads.items():
+            with self.subTest(name):
+                with self.assertRaises(ValueError):
+                    batchcodec.decode_batch(payload)
+
+    def test_logger_skips_malformed_batch(self):
+        logger = load_mode('log')
+        # Only the codec and clock are needed; the Sense HAT, MQTT and writer are not used for invalid batches.
+        logger.batchcodec = batchcodec
+        logger.clock = clock
+        logger.writer = None
+        message = types.SimpleNamespace(topic=logger.batch_topic, payload=body(scale=0))
+        logger.on_message(None, None, message)
+
+if __name__ == '__main__':
+    unittest.main()
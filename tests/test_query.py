@@ -0,0 +1,102 @@
+"""
+Tests the file search, the hot window cache and the aggregates of the query API.
+
+Run from the project root:
+    python3 -m unittest discover tests
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import query  # noqa: E402
+from sensehat_iot.clock import NS_PER_SECOND  # noqa: E402
+
+# A fixed "now" on a block boundary, so the tests do not depend on the wall clock.
+NOW = 1_800_000_000 * NS_PER_SECOND // query.BLOCK_NS * query.BLOCK_NS
+
+class QueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'Temperature.csv')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_rows(self, times, mode='w'):
+        with open(self.path, mode) as file:
+            for index, ns in enumerate(times):
+                file.write(f"{ns}, {20 + index % 10:.2f}\n")
+
+    def test_seek_time_finds_first_row_at_or_after_target(self):
+        # Enough rows that the binary search runs before the linear scan.
+        times = [NOW + index * NS_PER_SECOND for index in range(2000)]
+        self.write_rows(times)
+        with open(self.path, 'rb') as file:
+            for target, expected in ((times[0] - 1, times[0]), (times[1234], times[1234]),
+                                     (times[1234] + 1, times[1235]), (times[-1] + 1, None)):
+                query.seek_time(file, target)
+                row = next(query.read_line_rows(file, 0, None), None)
+                self.assertEqual(row[0] if row else None, expected)
+
+    def test_open_block_is_extended_with_appended_rows(self):
+        cache = query.HotWindowCache(max_blocks=8)
+        self.write_rows([NOW + index * NS_PER_SECOND for index in range(10)])
+        self.assertEqual(len(list(cache.rows(self.path, NOW, NOW + query.BLOCK_NS, NOW))), 10)
+        block = cache.blocks[(self.path, NOW)]
+        offset = block.offset
+        self.write_rows([NOW + (10 + index) * NS_PER_SECOND for index in range(5)], 'a')
+        self.assertEqual(len(list(cache.rows(self.path, NOW, NOW + query.BLOCK_NS, NOW))), 15)
+        # The refresh continued after the rows already cached.
+        self.assertGreater(block.offset, offset)
+        self.assertFalse(block.complete)
+
+    def test_future_end_does_not_cache_blocks_after_now(self):
+        cache = query.HotWindowCache(max_blocks=8)
+        self.write_rows([NOW - 60 * NS_PER_SECOND + index * NS_PER_SECOND for index in range(60)])
+        rows = list(cache.rows(self.path, NOW - 60 * NS_PER_SECOND, NOW + 365 * 86400 * NS_PER_SECOND, NOW))
+        self.assertEqual(len(rows), 60)
+        self.assertTrue(all(start <= NOW for _, start in cache.blocks))
+        self.assertLessEqual(len(cache.blocks), 2)
+
+    def test_aggregate_buckets(self):
+        rows = [(NOW + index * NS_PER_SECOND, float(index)) for index in range(10)]
+        buckets = list(query.aggregate(rows, 4 * NS_PER_SECOND))
+        self.assertEqual([bucket[:4] for bucket in buckets],
+                         [(NOW, 4, 0.0, 3.0), (NOW + 4 * NS_PER_SECOND, 4, 4.0, 7.0),
+                          (NOW + 8 * NS_PER_SECOND, 2, 8.0, 9.0)])
+        self.assertEqual(buckets[1][4], 5.5)
+        self.assertEqual(list(query.aggregate(rows)), [(NOW, 10, 0.0, 9.0, 4.5)])
+        self.assertEqual(list(query.aggregate([], NS_PER_SECOND)), [])
+
+    def test_parse_time_rejects_huge_values(self):
+        for text in ('inf', 'nan', '1e300', '-1e300'):
+            with self.assertRaises(ValueError):
+                query.parse_time(text, NOW)
+        self.assertEqual(query.parse_time('-60', NOW), NOW - 60 * NS_PER_SECOND)
+
+    def test_invalid_parameters_are_answered_with_400(self):
+        self.write_rows([NOW + index * NS_PER_SECOND for index in range(10)])
+        server = query.QueryServer(('127.0.0.1', 0), self.directory.name, {'TempeTopic': 'Temperature.csv'},
+                                   query.HotWindowCache(max_blocks=8))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base = f'http://127.0.0.1:{server.server_port}/sensors/temperature/'
+            for path in ('aggregate?bucket=1e300', 'aggregate?bucket=inf', 'range?start=1e300', 'range?end=-1e300'):
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    urllib.request.urlopen(base + path, timeout=5)
+                self.assertEqual(raised.exception.code, 400, path)
+                self.assertIn('error', json.loads(raised.exception.read()))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""
+Tests that readings served from the sampler's snapshot are stamped with the time of their own sample.
+
+Run from the project root:
+    python3 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import clock, sampler  # noqa: E402
+
+def sample(value, ns):
+    return dict({key: value for key in sampler.SENSOR_GETTERS.values()}, ns=ns, interval=1.0)
+
+class SnapshotSenseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = sampler.Snapshot()
+        self.snapshot.update(sample(1.0, 100))
+        self.sense = sampler.SnapshotSense(self.snapshot, lambda: None)
+
+    def test_values_match_the_pinned_read_time(self):
+        self.assertEqual(clock.read_ns(self.sense), 100)
+        self.snapshot.update(sample(2.0, 200))
+        # A new sample arrived in the middle of the cycle; the cycle keeps reading the pinned one.
+        self.assertEqual((self.sense.get_temperature(), self.sense.get_temperature_from_pressure()), (1.0, 1.0))
+        self.assertEqual(clock.read_ns(self.sense), 200)
+        self.assertEqual(self.sense.get_humidity(), 2.0)
+
+    def test_getters_use_the_latest_sample_until_pinned(self):
+        self.assertEqual(self.sense.get_pressure(), 1.0)
+        self.snapshot.update(sample(2.0, 200))
+        self.assertEqual(self.sense.get_pressure(), 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Tests that the logger's CSV writer survives write errors and reports a dead worker.
+
+Run from the project root:
+    python3 -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from sensehat_iot import shardwriter  # noqa: E402
+
+class ShardedWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, title):
+        with open(os.path.join(self.directory.name, title)) as file:
+            return file.read().splitlines()
+
+    def test_unwritable_file_does_not_stop_the_worker(self):
+        # A directory in place of a file makes every open() of it fail.
+        os.mkdir(os.path.join(self.directory.name, 'Broken.csv'))
+        writer = shardwriter.ShardedWriter(self.directory.name, workers=1, topics=['a', 'b'])
+        for index in range(200):
+            writer.submit('a', 'Broken.csv', index, 1.0)
+            writer.submit('b', 'Good.csv', index, 2.0)
+        writer.close()
+        self.assertEqual(len(self.read('Good.csv')), 200)
+        self.assertEqual(writer.processes[0].exitcode, 0)
+
+    def test_dead_worker_is_reported_instead_of_blocking(self):
+        writer = shardwriter.ShardedWriter(self.directory.name, workers=1, queue_size=10)
+        writer.processes[0].kill()
+        writer.processes[0].join()
+        with mock.patch.object(shardwriter, 'PUT_TIMEOUT', 0.1):
+            with self.assertRaises(RuntimeError):
+                for index in range(20):
+                    writer.submit('a', 'Good.csv', index, 1.0)
+            # close() reports the dead worker and returns.
+            writer.close()
+
+if __name__ == '__main__':
+    unittest.main()